@@ -0,0 +1,68 @@
+import json
+import multiprocessing
+import sys
+import time
+
+from logic import *
+
+
+def main():
+
+    # Check command-line arguments
+    if len(sys.argv) not in [2, 3]:
+        sys.exit("Usage: python batch.py puzzles.jsonl [processes]")
+    processes = int(sys.argv[2]) if len(sys.argv) == 3 else None
+
+    # Solve puzzles in parallel, writing results in input order
+    with open(sys.argv[1]) as f:
+        lines = (line for line in f if line.strip())
+        with multiprocessing.Pool(processes) as pool:
+            for result in pool.imap(solve_puzzle, lines, chunksize=16):
+                print(json.dumps(result))
+
+
+def solve_puzzle(line):
+    """
+    Solves one puzzle definition given as a JSON line with a `name`,
+    its `knowledge` as a formula or a list of formulas, and optionally
+    extra `symbols` to report.
+
+    Return a dictionary with the value each symbol is known to take
+    (null if unknown) and the time spent parsing and solving, or with
+    an `error` message if the line could not be read or solved.
+    """
+    start = time.perf_counter()
+    result = {"name": None}
+    try:
+        puzzle = json.loads(line)
+        result["name"] = puzzle.get("name")
+        knowledge = puzzle["knowledge"]
+        if isinstance(knowledge, str):
+            knowledge = [knowledge]
+        knowledge = And(*[parse(formula) for formula in knowledge])
+    except Exception as error:
+        result["error"] = f"{type(error).__name__}: {error}"
+        return result
+    parsed = time.perf_counter()
+
+    try:
+        result["satisfiable"] = True
+        symbols = entailments(knowledge, puzzle.get("symbols"))
+        result["symbols"] = dict(sorted(symbols.items()))
+    except ValueError:
+        result["satisfiable"] = False
+        result["symbols"] = {}
+    except Exception as error:
+        del result["satisfiable"]
+        result["error"] = f"{type(error).__name__}: {error}"
+        return result
+    solved = time.perf_counter()
+
+    result["seconds"] = {
+        "parse": parsed - start,
+        "solve": solved - parsed
+    }
+    return result
+
+if __name__ == "__main__":
+    main()
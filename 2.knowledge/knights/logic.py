@@ -1,4 +1,7 @@
 import itertools
+import multiprocessing
+import os
+import re
 
 
 class Sentence():
@@ -127,7 +130,7 @@ class And(Sentence):
                            for conjunct in self.conjuncts])
 
     def symbols(self):
-        return set.union(*[conjunct.symbols() for conjunct in self.conjuncts])
+        return set().union(*[conjunct.symbols() for conjunct in self.conjuncts])
 
 
 class Or(Sentence):
@@ -158,7 +161,7 @@ class Or(Sentence):
                             for disjunct in self.disjuncts])
 
     def symbols(self):
-        return set.union(*[disjunct.symbols() for disjunct in self.disjuncts])
+        return set().union(*[disjunct.symbols() for disjunct in self.disjuncts])
 
 
 class Implication(Sentence):
@@ -217,47 +220,736 @@ class Biconditional(Sentence):
                     and not self.right.evaluate(model)))
 
     def formula(self):
-        left = Sentence.parenthesize(str(self.left))
-        right = Sentence.parenthesize(str(self.right))
+        left = Sentence.parenthesize(self.left.formula())
+        right = Sentence.parenthesize(self.right.formula())
         return f"{left} <=> {right}"
 
     def symbols(self):
         return set.union(self.left.symbols(), self.right.symbols())
 
 
-def model_check(knowledge, query):
-    """Checks if knowledge base entails query."""
+def check_all(knowledge, query, symbols, model):
+    """Checks if knowledge base entails query, given a particular model."""
 
-    def check_all(knowledge, query, symbols, model):
-        """Checks if knowledge base entails query, given a particular model."""
+    # If model has an assignment for each symbol
+    if not symbols:
 
-        # If model has an assignment for each symbol
-        if not symbols:
+        # If knowledge base is true in model, then query must also be true
+        if knowledge.evaluate(model):
+            return query.evaluate(model)
+        return True
+    else:
 
-            # If knowledge base is true in model, then query must also be true
-            if knowledge.evaluate(model):
-                return query.evaluate(model)
-            return True
-        else:
+        # Choose one of the remaining unused symbols
+        remaining = symbols.copy()
+        p = remaining.pop()
+
+        # Create a model where the symbol is true
+        model_true = model.copy()
+        model_true[p] = True
+
+        # Create a model where the symbol is false
+        model_false = model.copy()
+        model_false[p] = False
 
-            # Choose one of the remaining unused symbols
-            remaining = symbols.copy()
-            p = remaining.pop()
+        # Ensure entailment holds in both models
+        return (check_all(knowledge, query, remaining, model_true) and
+                check_all(knowledge, query, remaining, model_false))
 
-            # Create a model where the symbol is true
-            model_true = model.copy()
-            model_true[p] = True
 
-            # Create a model where the symbol is false
-            model_false = model.copy()
-            model_false[p] = False
+def model_check(knowledge, query, preprocess=False, probe=False):
+    """
+    Checks if knowledge base entails query.
 
-            # Ensure entailment holds in both models
-            return (check_all(knowledge, query, remaining, model_true) and
-                    check_all(knowledge, query, remaining, model_false))
+    With `preprocess`, the knowledge base is simplified first and the
+    symbols it fixes are left out of the enumeration. `probe` is passed
+    on to simplify().
+    """
+    model = dict()
+    if preprocess:
+        knowledge, model, _ = simplify(knowledge, probe)
 
     # Get all symbols in both knowledge and query
-    symbols = set.union(knowledge.symbols(), query.symbols())
+    symbols = set.union(knowledge.symbols(), query.symbols()) - set(model)
 
     # Check that knowledge entails query
-    return check_all(knowledge, query, symbols, dict())
+    return check_all(knowledge, query, symbols, model)
+
+
+def check_subspace(task):
+    """Checks entailment inside the sub-space fixed by a partial model."""
+    knowledge, query, symbols, model = task
+    return check_all(knowledge, query, symbols, model)
+
+
+def parallel_model_check(knowledge, query, split=None, processes=None,
+                         preprocess=False, probe=False):
+    """
+    Checks if knowledge base entails query using a process pool.
+
+    The assignment space is split on the first `split` symbols and each
+    of the 2^split sub-spaces is checked by a worker. As soon as one
+    sub-space contains a counterexample the remaining workers are stopped.
+    `preprocess` and `probe` work as in model_check().
+    """
+    model = dict()
+    if preprocess:
+        knowledge, model, _ = simplify(knowledge, probe)
+
+    # Get all symbols in a fixed order so the split is reproducible
+    symbols = sorted(
+        set.union(knowledge.symbols(), query.symbols()) - set(model)
+    )
+
+    if processes is None:
+        processes = os.cpu_count() or 1
+
+    # By default make a few sub-spaces per process to balance the load
+    if split is None:
+        split = (4 * processes - 1).bit_length()
+    split = min(split, len(symbols))
+
+    fixed = symbols[:split]
+    remaining = set(symbols[split:])
+    tasks = (
+        (knowledge, query, remaining, {**model, **dict(zip(fixed, values))})
+        for values in itertools.product((True, False), repeat=split)
+    )
+
+    # Leaving the pool context terminates any worker still running
+    with multiprocessing.Pool(processes) as pool:
+        for entailed in pool.imap_unordered(check_subspace, tasks):
+            if not entailed:
+                return False
+    return True
+
+
+def is_true(sentence):
+    """Checks if a sentence is the empty conjunction, which is always true."""
+    return isinstance(sentence, And) and not sentence.conjuncts
+
+
+def is_false(sentence):
+    """Checks if a sentence is the empty disjunction, which is always false."""
+    return isinstance(sentence, Or) and not sentence.disjuncts
+
+
+def negate(sentence):
+    """Returns the negation of a sentence, folding constants and double Not."""
+    if is_true(sentence):
+        return Or()
+    if is_false(sentence):
+        return And()
+    if isinstance(sentence, Not):
+        return sentence.operand
+    return Not(sentence)
+
+
+def condition(sentence, model):
+    """
+    Returns sentence with every symbol in model replaced by its value.
+
+    Constants are folded away, using And() for true and Or() for false,
+    nested And/Or nodes are flattened into their parent and duplicated
+    operands are removed.
+    """
+    if isinstance(sentence, Symbol):
+        if sentence.name in model:
+            return And() if model[sentence.name] else Or()
+        return sentence
+
+    if isinstance(sentence, Not):
+        return negate(condition(sentence.operand, model))
+
+    if isinstance(sentence, (And, Or)):
+        conjunction = isinstance(sentence, And)
+        operands = sentence.conjuncts if conjunction else sentence.disjuncts
+
+        # The operand value that decides the whole node, and the neutral one
+        absorbing, neutral = (is_false, is_true) if conjunction else (
+            is_true, is_false
+        )
+        kind = And if conjunction else Or
+
+        flattened = []
+        seen = set()
+        for operand in operands:
+            operand = condition(operand, model)
+            if absorbing(operand):
+                return operand
+            if neutral(operand):
+                continue
+            nested = [operand]
+            if isinstance(operand, kind):
+                nested = (operand.conjuncts if conjunction
+                          else operand.disjuncts)
+            for item in nested:
+                if item in seen:
+                    continue
+                # A literal together with its complement decides the node
+                if negate(item) in seen:
+                    return Or() if conjunction else And()
+                seen.add(item)
+                flattened.append(item)
+
+        if len(flattened) == 1:
+            return flattened[0]
+        return kind(*flattened)
+
+    if isinstance(sentence, Implication):
+        antecedent = condition(sentence.antecedent, model)
+        consequent = condition(sentence.consequent, model)
+
+        # The consequent only matters where a literal antecedent holds
+        if isinstance(antecedent, Symbol):
+            consequent = condition(consequent, {antecedent.name: True})
+        elif (isinstance(antecedent, Not)
+              and isinstance(antecedent.operand, Symbol)):
+            consequent = condition(consequent,
+                                   {antecedent.operand.name: False})
+        if is_false(antecedent) or is_true(consequent):
+            return And()
+        if is_true(antecedent):
+            return consequent
+        if is_false(consequent):
+            return negate(antecedent)
+        if antecedent == consequent:
+            return And()
+        return Implication(antecedent, consequent)
+
+    if isinstance(sentence, Biconditional):
+        left = condition(sentence.left, model)
+        right = condition(sentence.right, model)
+        if is_true(left):
+            return right
+        if is_false(left):
+            return negate(right)
+        if is_true(right):
+            return left
+        if is_false(right):
+            return negate(left)
+        if left == right:
+            return And()
+        return Biconditional(left, right)
+
+    raise TypeError("must be a logical sentence")
+
+
+def clauses(sentence):
+    """Returns the top-level conjuncts of a sentence."""
+    if isinstance(sentence, And):
+        return sentence.conjuncts
+    return [sentence]
+
+
+def propagate(sentence, model):
+    """
+    Repeatedly fixes the symbols of top-level literals in the model and
+    conditions the sentence on them, until no literal is left.
+    """
+    while not is_false(sentence):
+
+        # Top-level literals fix the value of their symbol
+        units = dict()
+        for clause in clauses(sentence):
+            if isinstance(clause, Symbol):
+                units.setdefault(clause.name, True)
+            elif (isinstance(clause, Not)
+                  and isinstance(clause.operand, Symbol)):
+                units.setdefault(clause.operand.name, False)
+        if not units:
+            break
+
+        # Conflicting literals make the sentence false when conditioned
+        model.update(units)
+        sentence = condition(sentence, model)
+
+    return sentence
+
+
+def failed_literal(sentence):
+    """
+    Looks for a symbol whose value is forced because assuming the
+    opposite value propagates to a contradiction.
+    Returns a (name, value) pair, or None if no symbol is forced.
+    """
+    for name in sorted(sentence.symbols()):
+        for value in (True, False):
+            if is_false(propagate(condition(sentence, {name: value}),
+                                  {name: value})):
+                return name, not value
+    return None
+
+
+def simplify(knowledge, probe=False):
+    """
+    Simplifies a knowledge base by flattening, removing duplicates and
+    propagating unit facts until no more symbols can be fixed.
+    With `probe`, symbols whose opposite value fails are fixed as well;
+    each probing round conditions the knowledge base once per symbol,
+    so it is only worth it on small or heavily constrained inputs.
+
+    Returns the simplified sentence, the model of fixed symbols and a
+    dictionary reporting how many symbols and clauses were removed.
+    An unsatisfiable knowledge base simplifies to Or().
+    """
+    model = dict()
+    sentence = propagate(condition(knowledge, model), model)
+
+    while probe and not is_false(sentence):
+        forced = failed_literal(sentence)
+        if forced is None:
+            break
+        name, value = forced
+        model[name] = value
+        sentence = propagate(condition(sentence, model), model)
+
+    removed = {
+        "symbols": len(knowledge.symbols()) - len(sentence.symbols()),
+        "clauses": len(clauses(knowledge)) - len(clauses(sentence))
+    }
+    return sentence, model, removed
+
+
+def components(sentence):
+    """
+    Splits the top-level clauses of a sentence into groups that share
+    no symbols. Returns a list of sentences, one per group.
+    """
+    parent = dict()
+
+    def find(name):
+        while parent[name] != name:
+            parent[name] = parent[parent[name]]
+            name = parent[name]
+        return name
+
+    # Join the symbols of every clause into one set
+    for clause in clauses(sentence):
+        names = list(clause.symbols())
+        for name in names:
+            parent.setdefault(name, name)
+        for name in names[1:]:
+            parent[find(name)] = find(names[0])
+
+    groups = dict()
+    for clause in clauses(sentence):
+        names = clause.symbols()
+        root = find(next(iter(names))) if names else None
+        groups.setdefault(root, []).append(clause)
+
+    return [
+        group[0] if len(group) == 1 else And(*group)
+        for group in groups.values()
+    ]
+
+
+def branch_symbol(sentence):
+    """Chooses the symbol that occurs in the most top-level clauses."""
+    occurrences = dict()
+    for clause in clauses(sentence):
+        for name in clause.symbols():
+            occurrences[name] = occurrences.get(name, 0) + 1
+    return max(sorted(occurrences), key=lambda name: occurrences[name])
+
+
+def count_own_models(sentence, cache):
+    """Counts the models of a sentence over its own symbols."""
+    if is_false(sentence):
+        return 0
+    if is_true(sentence):
+        return 1
+    if sentence in cache:
+        return cache[sentence]
+
+    parts = components(sentence)
+    if len(parts) > 1:
+
+        # Independent groups multiply their counts
+        total = 1
+        for part in parts:
+            total *= count_own_models(part, cache)
+    else:
+
+        # Branch on one symbol; symbols that vanish are free in the branch
+        symbols = sentence.symbols()
+        p = branch_symbol(sentence)
+        total = 0
+        for value in (True, False):
+            branch = condition(sentence, {p: value})
+            free = len(symbols) - 1 - len(branch.symbols())
+            total += count_own_models(branch, cache) * 2 ** free
+
+    cache[sentence] = total
+    return total
+
+
+def count_models(knowledge, symbols=None, cache=None):
+    """
+    Returns the number of models of the knowledge base.
+
+    Models range over the knowledge base symbols plus any extra names
+    in `symbols`. Independent components are counted separately and
+    sub-results are kept in `cache`, which may be shared across calls.
+    """
+    if cache is None:
+        cache = dict()
+    names = knowledge.symbols()
+    if symbols is not None:
+        names = names | set(symbols)
+
+    # Symbols folded away by conditioning, as in a tautology, are free
+    conditioned = condition(knowledge, {})
+    free = len(names - conditioned.symbols())
+    return count_own_models(conditioned, cache) * 2 ** free
+
+
+def own_models(sentence, cache):
+    """Generates the models of a sentence over its own symbols."""
+    if is_false(sentence):
+        return
+    if is_true(sentence):
+        yield dict()
+        return
+
+    parts = components(sentence)
+    if len(parts) > 1:
+
+        # Stream the first group; later groups are listed once and cached
+        first, rest = parts[0], parts[1:]
+        for part in rest:
+            if part not in cache:
+                cache[part] = list(own_models(part, cache))
+        for model in own_models(first, cache):
+            for others in itertools.product(*[cache[part] for part in rest]):
+                combined = dict(model)
+                for other in others:
+                    combined.update(other)
+                yield combined
+        return
+
+    # Branch on one symbol; symbols that vanish take both values
+    symbols = sentence.symbols()
+    p = branch_symbol(sentence)
+    for value in (True, False):
+        branch = condition(sentence, {p: value})
+        free = sorted(symbols - branch.symbols() - {p})
+        for model in own_models(branch, cache):
+            for values in itertools.product((True, False), repeat=len(free)):
+                combined = dict(model)
+                combined.update(zip(free, values))
+                combined[p] = value
+                yield combined
+
+
+def iter_models(knowledge, symbols=None):
+    """
+    Generates every model of the knowledge base as a dictionary from
+    symbol name to value, without building the full list of models.
+
+    Models range over the knowledge base symbols plus any extra names
+    in `symbols`.
+    """
+    names = knowledge.symbols()
+    if symbols is not None:
+        names = names | set(symbols)
+
+    # Symbols folded away by conditioning, as in a tautology, are free
+    conditioned = condition(knowledge, {})
+    free = sorted(names - conditioned.symbols())
+    for model in own_models(conditioned, dict()):
+        for values in itertools.product((True, False), repeat=len(free)):
+            combined = dict(model)
+            combined.update(zip(free, values))
+            yield combined
+
+
+def marginals(knowledge, symbols=None):
+    """
+    Returns, for every symbol, the fraction of models of the knowledge
+    base in which the symbol is true.
+    """
+    cache = dict()
+    names = knowledge.symbols()
+    if symbols is not None:
+        names = names | set(symbols)
+    total = count_models(knowledge, names, cache)
+    if not total:
+        raise ValueError("knowledge base has no models")
+
+    probabilities = dict()
+    for name in sorted(names):
+        branch = condition(knowledge, {name: True})
+        models = count_models(branch, names - {name}, cache)
+        probabilities[name] = models / total
+    return probabilities
+
+
+TOKENS = re.compile(r"<=>|=>|[()¬∧∨]|[^()¬∧∨<=]+")
+PRECEDENCE = {"¬": 4, "∧": 3, "∨": 2, "=>": 1, "<=>": 0}
+SEPARATORS = {And: " ∧ ", Or: " ∨  "}
+
+
+def needs_parentheses(sentence):
+    """
+    Checks if formula() of the sentence would be parenthesized when it
+    appears inside another formula, without building the string.
+    """
+    while isinstance(sentence, (And, Or)):
+        operands = (sentence.conjuncts if isinstance(sentence, And)
+                    else sentence.disjuncts)
+        if len(operands) != 1:
+            return len(operands) > 1
+        sentence = operands[0]
+    if isinstance(sentence, Symbol):
+        return Sentence.parenthesize(sentence.name) != sentence.name
+    return True
+
+
+def serialize(sentence):
+    """
+    Returns the same string as sentence.formula(), built with an explicit
+    stack in time linear in the size of the output.
+    """
+    parts = []
+    stack = [sentence]
+
+    def push(*items):
+        """Pushes items so they are emitted in order, parenthesizing operands."""
+        for item in reversed(items):
+            if isinstance(item, Sentence) and needs_parentheses(item):
+                stack.extend([")", item, "("])
+            else:
+                stack.append(item)
+
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            parts.append(item)
+        elif isinstance(item, Symbol):
+            parts.append(item.name)
+        elif isinstance(item, Not):
+            push("¬", item.operand)
+        elif isinstance(item, (And, Or)):
+            operands = (item.conjuncts if isinstance(item, And)
+                        else item.disjuncts)
+            if len(operands) == 1:
+                stack.append(operands[0])
+                continue
+            items = []
+            for i, operand in enumerate(operands):
+                if i:
+                    items.append(SEPARATORS[type(item)])
+                items.append(operand)
+            push(*items)
+        elif isinstance(item, Implication):
+            push(item.antecedent, " => ", item.consequent)
+        elif isinstance(item, Biconditional):
+            push(item.left, " <=> ", item.right)
+        else:
+            raise TypeError("must be a logical sentence")
+
+    return "".join(parts)
+
+
+def parse(text):
+    """
+    Parses a formula in the syntax produced by formula() into a sentence.
+
+    Binds ¬ tighter than ∧, ∧ tighter than ∨, ∨ tighter than =>, and
+    => tighter than <=>; => groups to the right. A run of ∧ or ∨ builds
+    a single And or Or. Runs in linear time with explicit stacks.
+    """
+    values = []
+    operators = []
+
+    def reduce():
+        """Applies the operator on top of the stack to its operands."""
+        operator, arity = operators.pop()
+        if operator == "¬":
+            values.append(Not(values.pop()))
+            return
+        operands = values[-arity:]
+        del values[-arity:]
+        if operator == "∧":
+            values.append(And(*operands))
+        elif operator == "∨":
+            values.append(Or(*operands))
+        elif operator == "=>":
+            values.append(Implication(*operands))
+        else:
+            values.append(Biconditional(*operands))
+
+    expect_operand = True
+    for match in TOKENS.finditer(text):
+        token = match.group()
+        if token not in PRECEDENCE and token not in "()":
+            token = token.strip()
+            if not token:
+                continue
+            if not expect_operand:
+                raise ValueError(f"unexpected symbol {token!r}")
+            values.append(Symbol(token))
+            expect_operand = False
+
+        elif token == "(":
+            if not expect_operand:
+                raise ValueError("unexpected '('")
+            operators.append(("(", 0))
+
+        elif token == ")":
+            if expect_operand:
+                raise ValueError("unexpected ')'")
+            while operators and operators[-1][0] != "(":
+                reduce()
+            if not operators:
+                raise ValueError("unbalanced ')'")
+            operators.pop()
+
+        elif token == "¬":
+            if not expect_operand:
+                raise ValueError("unexpected '¬'")
+            operators.append(("¬", 1))
+
+        else:
+            if expect_operand:
+                raise ValueError(f"unexpected {token!r}")
+            precedence = PRECEDENCE[token]
+            while operators and operators[-1][0] != "(":
+                top = operators[-1][0]
+                if top == token and token in ("∧", "∨"):
+                    break
+                if PRECEDENCE[top] > precedence or (
+                    PRECEDENCE[top] == precedence and token != "=>"
+                ):
+                    reduce()
+                else:
+                    break
+
+            # Extend a run of the same associative operator
+            if operators and operators[-1][0] == token and token in ("∧", "∨"):
+                operators[-1] = (token, operators[-1][1] + 1)
+            else:
+                operators.append((token, 2))
+            expect_operand = True
+
+    if expect_operand:
+        raise ValueError("incomplete formula")
+    while operators:
+        if operators[-1][0] == "(":
+            raise ValueError("unbalanced '('")
+        reduce()
+    return values.pop()
+
+
+def load_knowledge(file):
+    """
+    Reads a knowledge base from a file with one formula per line,
+    skipping blank lines and lines starting with '#'.
+    """
+    conjuncts = []
+    for line in file:
+        line = line.strip()
+        if line and not line.startswith("#"):
+            conjuncts.append(parse(line))
+    return And(*conjuncts)
+
+
+def dump_knowledge(knowledge, file):
+    """Writes each top-level clause of a knowledge base on its own line."""
+    for clause in clauses(knowledge):
+        file.write(serialize(clause) + "\n")
+
+
+def literal_number(sentence, numbers):
+    """Returns the DIMACS number of a literal, numbering new symbols."""
+    negated = isinstance(sentence, Not)
+    if negated:
+        sentence = sentence.operand
+    if not isinstance(sentence, Symbol):
+        raise ValueError("knowledge base is not in CNF")
+    number = numbers.setdefault(sentence.name, len(numbers) + 1)
+    return -number if negated else number
+
+
+def dump_dimacs(knowledge, file):
+    """
+    Writes a knowledge base in conjunctive normal form as DIMACS CNF.
+    Symbol names are kept in "c symbol <number> <name>" comment lines.
+    """
+    numbers = dict()
+    rows = []
+    for clause in clauses(knowledge):
+        literals = clause.disjuncts if isinstance(clause, Or) else [clause]
+        rows.append([literal_number(literal, numbers) for literal in literals])
+
+    for name, number in numbers.items():
+        file.write(f"c symbol {number} {name}\n")
+    file.write(f"p cnf {len(numbers)} {len(rows)}\n")
+    for row in rows:
+        file.write(" ".join(map(str, row + [0])) + "\n")
+
+
+def load_dimacs(file):
+    """
+    Reads a DIMACS CNF file into an And of Or clauses, naming symbols
+    from "c symbol" comment lines or by their number otherwise.
+    """
+    names = dict()
+    rows = []
+    clause = []
+    for line in file:
+        fields = line.split()
+        if not fields or fields[0] in ("p", "%"):
+            continue
+        if fields[0] == "c":
+            if len(fields) > 3 and fields[1] == "symbol":
+                names[int(fields[2])] = line.split(None, 3)[3].strip()
+            continue
+        for field in fields:
+            number = int(field)
+            if number:
+                clause.append(number)
+                continue
+            rows.append(clause)
+            clause = []
+    if clause:
+        rows.append(clause)
+
+    def literal(number):
+        """Returns the sentence for a DIMACS literal."""
+        symbol = Symbol(names.get(abs(number), str(abs(number))))
+        return symbol if number > 0 else Not(symbol)
+
+    return And(*[
+        literal(clause[0]) if len(clause) == 1
+        else Or(*[literal(number) for number in clause])
+        for clause in rows
+    ])
+
+
+def entailments(knowledge, symbols=None, probe=False):
+    """
+    Solves every symbol of a knowledge base at once.
+
+    Returns a dictionary mapping each symbol name to True if the
+    knowledge base entails the symbol, False if it entails its negation
+    and None if neither. The knowledge base is simplified once and the
+    remaining symbols share one model-counting cache, instead of running
+    a separate model check per symbol. `probe` is passed on to simplify().
+    """
+    names = knowledge.symbols()
+    if symbols is not None:
+        names = names | set(symbols)
+
+    sentence, model, _ = simplify(knowledge, probe)
+    if is_false(sentence):
+        raise ValueError("knowledge base has no models")
+
+    results = {name: model[name] for name in names if name in model}
+    remaining = names - set(model)
+    if remaining:
+        for name, probability in marginals(sentence, remaining).items():
+            results[name] = (True if probability == 1
+                             else False if probability == 0 else None)
+    return results
@@ -1,3 +1,5 @@
+import sys
+
 from logic import *
 
 AKnight = Symbol("A is a Knight")
@@ -102,9 +104,17 @@ def main():
             print("    Not yet implemented.")
         else:
             for symbol in symbols:
-                if model_check(knowledge, symbol):
+                if model_check(knowledge, symbol, preprocess=True):
                     print(f"    {symbol}")
 
+            # Optionally list every world consistent with the puzzle
+            if "--worlds" in sys.argv[1:]:
+                names = [symbol.name for symbol in symbols]
+                print(f"    Worlds: {count_models(knowledge, names)}")
+                for model in iter_models(knowledge, names):
+                    world = [name for name in names if model[name]]
+                    print(f"      {', '.join(world)}")
+
 
 if __name__ == "__main__":
     main()
@@ -1,34 +1,69 @@
+import collections
+import contextlib
 import itertools
+import json
+import math
 import random
+import time
+
+import numpy as np
+
+from topology import MooreTopology
+
+# Largest frontier component solved exactly; bigger ones are estimated
+SOLVER_CELLS = 400
+
+# Timer used for every section when the AI is not profiling
+NO_TIMER = contextlib.nullcontext()
 
 
 class Minesweeper():
     """
     Minesweeper game representation
+
+    The board is a height x width grid unless another topology,
+    e.g. a hexagonal, toroidal or 3D board, is given.
     """
 
-    def __init__(self, height=8, width=8, mines=8):
+    def __init__(self, height=8, width=8, mines=8, safe=None, topology=None):
+
+        # Set the board shape and the neighbors of each cell
+        if topology is None:
+            topology = MooreTopology((height, width))
+        self.topology = topology
+        self.shape = topology.shape
 
-        # Set initial width, height, and number of mines
-        self.height = height
-        self.width = width
-        self.mines = set()
+        # Height and width only describe flat boards
+        self.height, self.width = (
+            self.shape if len(self.shape) == 2 else (None, None)
+        )
 
         # Initialize an empty field with no mines
-        self.board = []
-        for i in range(self.height):
-            row = []
-            for j in range(self.width):
-                row.append(False)
-            self.board.append(row)
-
-        # Add mines randomly
-        while len(self.mines) != mines:
-            i = random.randrange(height)
-            j = random.randrange(width)
-            if not self.board[i][j]:
-                self.mines.add((i, j))
-                self.board[i][j] = True
+        self.board = np.zeros(topology.shape, dtype=bool)
+
+        # Leave out the safe cell, e.g. the first click, and its neighbors,
+        # or only the safe cell if the other cells cannot hold every mine
+        excluded = []
+        if safe is not None:
+            index = topology.index(safe)
+            excluded = sorted([index] + topology.neighbors_of(index))
+            if topology.cells - len(excluded) < mines:
+                excluded = [index]
+        available = topology.cells - len(excluded)
+        if not 0 <= mines <= available:
+            raise ValueError(f"cannot place {mines} mines on the board")
+
+        # Sample mine positions without replacement among available cells,
+        # then shift them past the excluded cells in increasing order
+        positions = np.array(random.sample(range(available), mines),
+                             dtype=np.int64)
+        for index in excluded:
+            positions[positions >= index] += 1
+        self.board.reshape(-1)[positions] = True
+        self.mines = {topology.cell(index) for index in positions}
+
+        # Count the mines around every cell once
+        self.counts = topology.counts(self.board)
 
         # At first, player has found no mines
         self.mines_found = set()
@@ -37,45 +72,37 @@ class Minesweeper():
         """
         Prints a text-based representation
         of where mines are located.
-        """
-        for i in range(self.height):
-            print("--" * self.width + "-")
-            for j in range(self.width):
-                if self.board[i][j]:
-                    print("|X", end="")
-                else:
-                    print("| ", end="")
-            print("|")
-        print("--" * self.width + "-")
+        Boards with more than two dimensions are printed one
+        two-dimensional layer at a time.
+        """
+        board = self.board.reshape((-1,) + self.shape[-2:])
+        if len(self.shape) < 2:
+            board = self.board.reshape(1, 1, -1)
+        layers = list(np.ndindex(self.shape[:-2]))
+        for layer, grid in zip(layers, board):
+            if len(self.shape) > 2:
+                print(f"Layer {layer}")
+            height, width = grid.shape
+            for i in range(height):
+                print("--" * width + "-")
+                for j in range(width):
+                    if grid[i][j]:
+                        print("|X", end="")
+                    else:
+                        print("| ", end="")
+                print("|")
+            print("--" * width + "-")
 
     def is_mine(self, cell):
-        i, j = cell
-        return self.board[i][j]
+        return bool(self.board[tuple(cell)])
 
     def nearby_mines(self, cell):
         """
         Returns the number of mines that are
-        within one row and column of a given cell,
+        neighbors of a given cell,
         not including the cell itself.
         """
-
-        # Keep count of nearby mines
-        count = 0
-
-        # Loop over all cells within one row and column
-        for i in range(cell[0] - 1, cell[0] + 2):
-            for j in range(cell[1] - 1, cell[1] + 2):
-
-                # Ignore the cell itself
-                if (i, j) == cell:
-                    continue
-
-                # Update count if cell in bounds and is mine
-                if 0 <= i < self.height and 0 <= j < self.width:
-                    if self.board[i][j]:
-                        count += 1
-
-        return count
+        return int(self.counts[tuple(cell)])
 
     def won(self):
         """
@@ -84,6 +111,27 @@ class Minesweeper():
         return self.mines_found == self.mines
 
 
+def log_sum(values):
+    """Returns the log of the sum of the exponentials of `values`."""
+    values = [value for value in values if value != -math.inf]
+    if not values:
+        return -math.inf
+    top = max(values)
+    return top + math.log(sum(math.exp(value - top) for value in values))
+
+
+def log_convolve(first, second):
+    """
+    Combines two dicts mapping a number of mines to the log of the ways
+    to place them into the log of the ways to place each total.
+    """
+    terms = dict()
+    for k, a in first.items():
+        for j, b in second.items():
+            terms.setdefault(k + j, []).append(a + b)
+    return {k: log_sum(values) for k, values in terms.items()}
+
+
 class Sentence():
     """
     Logical statement about a Minesweeper game
@@ -98,6 +146,11 @@ class Sentence():
     def __eq__(self, other):
         return self.cells == other.cells and self.count == other.count
 
+    def __hash__(self):
+        # Sentences are hashed by value, so a sentence must be taken out
+        # of any set or dict before its cells or count change
+        return hash((frozenset(self.cells), self.count))
+
     def __str__(self):
         return f"{self.cells} = {self.count}"
 
@@ -144,45 +197,349 @@ class Sentence():
             self.cells.remove(cell)
 
 
+@contextlib.contextmanager
+def section_timer(timings, section):
+    """Adds the time spent inside the block to `timings[section]`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[section] = (
+            timings.get(section, 0.0) + time.perf_counter() - start
+        )
+
+
+class CompactSentence():
+    """
+    Immutable sentence about integer cell indices.
+
+    The cells are stored as a bitmask in which bit b stands for cell
+    base + b, with base the lowest cell, so a mask is only as wide as
+    the span of its cells. Subset tests and differences are bitwise
+    operations, and sentences are hashable so they dedupe in a set.
+    """
+
+    __slots__ = ("base", "mask", "count")
+
+    def __init__(self, base, mask, count):
+
+        # Keep the lowest cell in bit 0 so equal sentences compare equal
+        if mask:
+            low = (mask & -mask).bit_length() - 1
+            base += low
+            mask >>= low
+        else:
+            base = 0
+        self.base = base
+        self.mask = mask
+        self.count = count
+
+    @classmethod
+    def from_cells(cls, cells, count):
+        """Returns the sentence that `count` of the given cells are mines."""
+        if not cells:
+            return cls(0, 0, count)
+        base = min(cells)
+        mask = 0
+        for cell in cells:
+            mask |= 1 << (cell - base)
+        return cls(base, mask, count)
+
+    def __eq__(self, other):
+        return (isinstance(other, CompactSentence)
+                and self.base == other.base
+                and self.mask == other.mask
+                and self.count == other.count)
+
+    def __hash__(self):
+        return hash((self.base, self.mask, self.count))
+
+    def __len__(self):
+        return self.mask.bit_count()
+
+    def __iter__(self):
+        mask = self.mask
+        while mask:
+            low = mask & -mask
+            yield self.base + low.bit_length() - 1
+            mask ^= low
+
+    def __contains__(self, cell):
+        offset = cell - self.base
+        return offset >= 0 and bool(self.mask >> offset & 1)
+
+    def __str__(self):
+        return f"{set(self)} = {self.count}"
+
+    @property
+    def cells(self):
+        """Frozen set of the cells in the sentence."""
+        return frozenset(self)
+
+    def aligned(self, other):
+        """Returns both masks shifted to the lower of the two bases."""
+        base = min(self.base, other.base)
+        return (self.mask << (self.base - base),
+                other.mask << (other.base - base), base)
+
+    def issubset(self, other):
+        """Checks if every cell of this sentence is in `other`."""
+        if not self.mask:
+            return True
+        if self.base < other.base:
+            return False
+        mine, theirs, _ = self.aligned(other)
+        return not mine & ~theirs
+
+    def difference(self, other):
+        """
+        Returns the sentence about the cells of this sentence that are
+        not in `other`, given that `other` is a subset of this sentence.
+        """
+        mine, theirs, base = self.aligned(other)
+        return CompactSentence(base, mine & ~theirs, self.count - other.count)
+
+    def without(self, cell, mine):
+        """
+        Returns the sentence with `cell` removed, lowering the count if
+        the cell is a mine.
+        """
+        if cell not in self:
+            return self
+        return CompactSentence(
+            self.base, self.mask & ~(1 << (cell - self.base)),
+            self.count - 1 if mine else self.count
+        )
+
+    def known_mines(self):
+        """
+        Returns the cells known to be mines.
+        """
+        return list(self) if self.count == len(self) else []
+
+    def known_safes(self):
+        """
+        Returns the cells known to be safe.
+        """
+        return list(self) if self.count == 0 else []
+
+
 class MinesweeperAI():
     """
     Minesweeper game player
+
+    Cells are addressed internally by the integer index given by the
+    board topology, and what is known about each cell is kept in boolean
+    arrays. Cells are given and returned as tuples, (i, j) on the default
+    height x width grid.
     """
 
-    def __init__(self, height=8, width=8):
+    def __init__(self, height=8, width=8, mines=None, profile=False,
+                 topology=None):
+
+        # Set the board shape and the neighbors of each cell
+        if topology is None:
+            topology = MooreTopology((height, width))
+        self.topology = topology
+        self.shape = topology.shape
 
-        # Set initial height and width
-        self.height = height
-        self.width = width
+        # Height and width only describe flat boards
+        self.height, self.width = (
+            self.shape if len(self.shape) == 2 else (None, None)
+        )
+
+        # Total number of mines on the board, if known
+        self.total_mines = mines
+
+        cells = topology.cells
 
         # Keep track of which cells have been clicked on
-        self.moves_made = set()
+        self.move_mask = np.zeros(cells, dtype=bool)
 
         # Keep track of cells known to be safe or mines
-        self.mines = set()
-        self.safes = set()
-
-        # List of sentences about the game known to be true
-        self.knowledge = []
+        self.mine_mask = np.zeros(cells, dtype=bool)
+        self.safe_mask = np.zeros(cells, dtype=bool)
+        self.mine_count = 0
+
+        # Safe cells that have not been clicked on yet
+        self.safe_moves = set()
+
+        # Cells that are neither mines nor moves made, stored in the first
+        # possible_count entries of an array, with each cell's position in
+        # it, so that cells can be removed or sampled in constant time
+        self.possible = np.arange(cells)
+        self.possible_position = np.arange(cells)
+        self.possible_count = cells
+
+        # Set of sentences about the game known to be true
+        self.knowledge = set()
+
+        # Sentences indexed by each of their cells
+        self.index = dict()
+
+        # Sentences not yet compared with the rest of the knowledge
+        self.pending = []
+
+        # Cells concluded to be mines (True) or safe (False), not yet marked
+        self.marks = collections.deque()
+
+        # Solutions of frontier components, keyed by their sentences
+        self.solutions = dict()
+
+        # If profiling, seconds per section of the current move,
+        # and a record for each move made
+        self.profile = profile
+        self.timings = dict()
+        self.metrics = []
+
+    @property
+    def mines(self):
+        """Set of cells known to be mines."""
+        return {self.to_cell(index) for index in np.flatnonzero(self.mine_mask)}
+
+    @property
+    def safes(self):
+        """Set of cells known to be safe."""
+        return {self.to_cell(index) for index in np.flatnonzero(self.safe_mask)}
+
+    @property
+    def moves_made(self):
+        """Set of cells that have been clicked on."""
+        return {self.to_cell(index) for index in np.flatnonzero(self.move_mask)}
+
+    def timer(self, section):
+        """
+        Returns a context manager that adds the time spent inside it to
+        `section` of the current move, or does nothing if not profiling.
+        """
+        if not self.profile:
+            return NO_TIMER
+        return section_timer(self.timings, section)
+
+    def record_move(self, cell):
+        """
+        Stores the section timings of the move just made, together with
+        the size of the knowledge after it, and starts a new move.
+        """
+        self.metrics.append({
+            "move": list(cell),
+            "seconds": self.timings,
+            "knowledge": len(self.knowledge)
+        })
+        self.timings = dict()
+
+    def export_metrics(self, file):
+        """
+        Writes the game's per-move metrics and the total time per
+        section as JSON to an open file.
+        """
+        totals = dict()
+        for record in self.metrics:
+            for section, seconds in record["seconds"].items():
+                totals[section] = totals.get(section, 0.0) + seconds
+        json.dump({
+            "shape": list(self.shape),
+            "mines": self.total_mines,
+            "moves": len(self.metrics),
+            "seconds": totals,
+            "metrics": self.metrics
+        }, file)
+
+    def to_index(self, cell):
+        """Returns the integer index of a cell."""
+        return self.topology.index(cell)
+
+    def to_cell(self, index):
+        """Returns the cell of an integer index."""
+        return self.topology.cell(index)
+
+    def remove_possible(self, index):
+        """
+        Removes a cell from the possible moves by swapping it with
+        the last possible cell.
+        """
+        position = self.possible_position[index]
+        last = self.possible_count - 1
+        moved = self.possible[last]
+        self.possible[position] = moved
+        self.possible_position[moved] = position
+        self.possible[last] = index
+        self.possible_position[index] = last
+        self.possible_count = last
 
     def mark_mine(self, cell):
         """
         Marks a cell as a mine, and updates all knowledge
         to mark that cell as a mine as well.
         """
-        self.mines.add(cell)
-        for sentence in self.knowledge:
-            sentence.mark_mine(cell)
+        self.set_mine(self.to_index(cell))
 
     def mark_safe(self, cell):
         """
         Marks a cell as safe, and updates all knowledge
         to mark that cell as safe as well.
         """
-        self.safes.add(cell)
-        for sentence in self.knowledge:
-            sentence.mark_safe(cell)
+        self.set_safe(self.to_index(cell))
+
+    def set_mine(self, index):
+        """
+        Marks the cell with the given index as a mine in the state
+        arrays and in every sentence that contains it.
+        """
+        if self.mine_mask[index]:
+            return
+        self.mine_mask[index] = True
+        self.mine_count += 1
+        if not self.move_mask[index]:
+            self.remove_possible(index)
+        for sentence in list(self.index.get(index, ())):
+            self.remove_sentence(sentence)
+            self.add_sentence(sentence.without(index, True))
+
+    def set_safe(self, index):
+        """
+        Marks the cell with the given index as safe in the state
+        arrays and in every sentence that contains it.
+        """
+        if self.safe_mask[index]:
+            return
+        self.safe_mask[index] = True
+        if not self.move_mask[index]:
+            self.safe_moves.add(index)
+        for sentence in list(self.index.get(index, ())):
+            self.remove_sentence(sentence)
+            self.add_sentence(sentence.without(index, False))
 
+    def add_sentence(self, sentence):
+        """
+        Adds a sentence to the knowledge and to the index of each of
+        its cells, unless it is empty or an equal sentence is already
+        known. New sentences are queued for inference, and the cells
+        of a sentence that determines them are queued to be marked.
+        """
+        if not sentence.mask or sentence in self.knowledge:
+            return
+        self.knowledge.add(sentence)
+        for cell in sentence:
+            self.index.setdefault(cell, set()).add(sentence)
+        self.pending.append(sentence)
+
+        if sentence.count == 0:
+            self.marks.extend((cell, False) for cell in sentence)
+        elif sentence.count == len(sentence):
+            self.marks.extend((cell, True) for cell in sentence)
+
+    def remove_sentence(self, sentence):
+        """
+        Removes a sentence from the knowledge and from the index.
+        """
+        self.knowledge.discard(sentence)
+        for cell in sentence:
+            sentences = self.index.get(cell)
+            if sentences is not None:
+                sentences.discard(sentence)
+                if not sentences:
+                    del self.index[cell]
 
 
     def add_knowledge(self, cell, count):
@@ -200,27 +557,28 @@ class MinesweeperAI():
             5) add any new sentences to the AI's knowledge base
                if they can be inferred from existing knowledge
         """
+        index = self.to_index(cell)
         # Add cell to moves
-        self.moves_made.add(cell)
-        # Add cell to safes
-        self.safes.add(cell)
+        if not self.move_mask[index]:
+            self.move_mask[index] = True
+            self.safe_moves.discard(index)
+            self.remove_possible(index)
+        # Mark cell as safe
+        with self.timer("propagation"):
+            self.set_safe(index)
         # Calculate neighbors cells
-        neighbors = self.get_neighbors(cell)
-        # Check 
-        neighbors, count = self.check_neighbors(neighbors, count)
+        with self.timer("neighbors"):
+            neighbors = self.topology.neighbors_of(index)
+            neighbors, count = self.check_neighbors(neighbors, count)
         # Creates and add the new Sentence
-        sentence = Sentence(neighbors, count)
-
-        if sentence not in self.knowledge:
-            self.knowledge.append(sentence)
+        with self.timer("sentences"):
+            self.add_sentence(CompactSentence.from_cells(neighbors, count))
 
-        # Check mines and saves
-        self.check_mine_and_safe()
+        # Infer new sentences, mines and safes until nothing changes
+        self.check_sentences()
 
-                 
-        
-        self.check_mine_and_safe()
-        
+        if self.profile:
+            self.record_move(cell)
 
     def make_safe_move(self):
         """
@@ -231,101 +589,296 @@ class MinesweeperAI():
         This function may use the knowledge in self.mines, self.safes
         and self.moves_made, but should not modify any of those values.
         """
-        possible_moves = self.safes - self.moves_made
-        possible_moves = list(possible_moves)
+        with self.timer("selection"):
 
-        # Not safe moves
-        if not(len(possible_moves)):
-            return None
+            # Not safe moves
+            if not self.safe_moves:
+                return None
 
-        # Choose a random move in safe moves
-        index = random.randint(0, len(possible_moves) - 1)
-        print(f'possible moves are {possible_moves}, index is {index}')
-        move = possible_moves[index]
-        return move
+            # Any safe move will do
+            return self.to_cell(next(iter(self.safe_moves)))
 
     def make_random_move(self):
         """
         Returns a move to make on the Minesweeper board.
-        Should choose randomly among cells that:
+        Should choose among cells that:
             1) have not already been chosen, and
             2) are not known to be mines
+        picking at random among the cells least likely to be a mine.
         """
-        possible_moves = self.check_possible_moves()
-        possible_moves = list(possible_moves)
+        with self.timer("selection"):
+            probabilities, density = self.frontier_probabilities()
+
+            # If possible moves is empty, random move can not be done
+            if not probabilities and density is None:
+                return None
 
-        # If possible moves is empty, random move can not be done
-        if not(len(possible_moves)):
-            return None
+            # Unconstrained cells are at least as safe as any frontier cell
+            lowest = min(probabilities.values(), default=1.0)
+            if density is not None and density <= lowest + 1e-12:
+                return self.to_cell(self.random_unconstrained(probabilities))
 
-        # Return available
-        index = random.randint(0, len(possible_moves) - 1)
-        move = possible_moves[index]
-        return move
+            # Return one of the least risky moves
+            moves = [
+                index for index, probability in probabilities.items()
+                if probability <= lowest + 1e-12
+            ]
+            return self.to_cell(random.choice(moves))
 
+    def random_unconstrained(self, frontier):
+        """
+        Returns a random possible move that is neither in `frontier` nor
+        known to be safe, sampling the possible moves array directly.
+        """
+        for attempt in range(32):
+            index = int(self.possible[random.randrange(self.possible_count)])
+            if index not in frontier and index not in self.safe_moves:
+                return index
+        return random.choice([
+            index for index in self.possible[:self.possible_count].tolist()
+            if index not in frontier and index not in self.safe_moves
+        ])
 
+    def frontier_components(self):
+        """
+        Split the sentences in knowledge into groups that share no cells.
+        Return a list of frozensets of sentences.
+        """
+        components = []
+        seen = set()
+        for sentence in self.knowledge:
+            if sentence in seen:
+                continue
+
+            # Walk every sentence reachable through shared cells
+            component = {sentence}
+            frontier = [sentence]
+            while frontier:
+                current = frontier.pop()
+                for cell in current:
+                    for other in self.index.get(cell, ()):
+                        if other not in component:
+                            component.add(other)
+                            frontier.append(other)
+            seen.update(component)
+            components.append(frozenset(component))
+        return components
+
+    def solve_component(self, sentences):
+        """
+        Count the mine arrangements of a frontier component consistent with
+        its sentences, by backtracking over its cells and memoizing on the
+        number of mines each sentence still needs.
+
+        Returns the list of cells and a dict mapping a number of mines k to
+        a pair (ways, hits): how many arrangements place k mines, and for
+        each cell in how many of those arrangements it is a mine.
+        """
+        cell_sentences = dict()
+        for sentence in sentences:
+            for cell in sentence.cells:
+                cell_sentences.setdefault(cell, []).append(sentence)
+
+        # Order cells breadth first so sentences close early and prune
+        cells = []
+        queued = set()
+        for start in sorted(cell_sentences):
+            if start in queued:
+                continue
+            queued.add(start)
+            queue = [start]
+            while queue:
+                cell = queue.pop(0)
+                cells.append(cell)
+                for sentence in cell_sentences[cell]:
+                    for other in sorted(sentence.cells - queued):
+                        queued.add(other)
+                        queue.append(other)
+
+        # For each cell, its sentences and their cells still unassigned after it
+        position = {cell: i for i, cell in enumerate(cells)}
+        sentences = list(sentences)
+        touching = [[] for cell in cells]
+        for i, sentence in enumerate(sentences):
+            positions = sorted(position[cell] for cell in sentence.cells)
+            for left, pos in enumerate(reversed(positions)):
+                touching[pos].append((i, left))
+
+        memo = dict()
+
+        def search(pos, needed):
+            if pos == len(cells):
+                return {0: (1, ())}
+            key = (pos, needed)
+            if key in memo:
+                return memo[key]
+
+            result = dict()
+            for value in (0, 1):
+                state = list(needed)
+                consistent = True
+                for i, left in touching[pos]:
+                    state[i] -= value
+                    if state[i] < 0 or state[i] > left:
+                        consistent = False
+                        break
+                if not consistent:
+                    continue
+                for k, (ways, hits) in search(pos + 1, tuple(state)).items():
+                    k += value
+                    hits = (ways * value,) + hits
+                    if k in result:
+                        total, counted = result[k]
+                        result[k] = (
+                            total + ways,
+                            tuple(a + b for a, b in zip(counted, hits))
+                        )
+                    else:
+                        result[k] = (ways, hits)
+
+            memo[key] = result
+            return result
+
+        needed = tuple(sentence.count for sentence in sentences)
+        return cells, search(0, needed)
+
+    def estimate_component(self, sentences):
+        """
+        Estimate a component too large to solve exactly, giving each cell
+        the highest mine density among the sentences that contain it.
+        """
+        estimate = dict()
+        for sentence in sentences:
+            density = sentence.count / len(sentence)
+            for cell in sentence:
+                estimate[cell] = max(estimate.get(cell, 0), density)
+        return estimate
+
+    def mine_probabilities(self):
+        """
+        Return a dict mapping every cell that could be chosen as a move to
+        the probability that it is a mine.
+        """
+        probabilities, density = self.frontier_probabilities()
+        result = dict()
+        if density is not None:
+            for index in self.possible[:self.possible_count].tolist():
+                result[self.to_cell(index)] = density
+        for index, probability in probabilities.items():
+            result[self.to_cell(index)] = probability
+        return result
+
+    def frontier_probabilities(self):
+        """
+        Return a dict mapping the index of each frontier cell and each safe
+        cell not yet played to the probability that it is a mine, and the
+        probability shared by every other possible move (None if there is
+        no other possible move).
+
+        Frontier components are solved independently and cached until their
+        sentences change. If the total number of mines is known, the
+        components and the unconstrained cells are weighted exactly by the
+        number of ways the remaining mines can be placed; otherwise
+        unconstrained cells are assumed as dense as the frontier.
+        """
+        solutions = dict()
+        estimates = dict()
+        for component in self.frontier_components():
+            if component in self.solutions:
+                solutions[component] = self.solutions[component]
+            elif len(set().union(*[s.cells for s in component])) > SOLVER_CELLS:
+                estimates.update(self.estimate_component(component))
+            else:
+                solutions[component] = self.solve_component(component)
+        self.solutions = solutions
+
+        frontier = set(estimates)
+        for cells, _ in solutions.values():
+            frontier.update(cells)
+        unconstrained = (
+            self.possible_count - len(frontier) - len(self.safe_moves)
+        )
+
+        # Known safe cells that have not been played are certain
+        probabilities = {index: 0.0 for index in self.safe_moves}
+        probabilities.update(estimates)
+
+        remaining = None
+        if self.total_mines is not None:
+            remaining = self.total_mines - self.mine_count
+
+        # Work with logarithms, since arrangement counts overflow floats
+        distributions = [
+            {k: math.log(ways) for k, (ways, _) in counts.items()}
+            for _, counts in solutions.values()
+        ]
+
+        def log_outside(mines):
+            """Log of the ways to place the other mines in unconstrained cells."""
+            if remaining is None:
+                return 0.0
+            rest = remaining - mines
+            if rest < 0 or rest > unconstrained:
+                return -math.inf
+            return (math.lgamma(unconstrained + 1) - math.lgamma(rest + 1)
+                    - math.lgamma(unconstrained - rest + 1))
+
+        # Log of the ways to place each number of mines in the frontier,
+        # over the components before and after each component
+        prefixes = [{0: 0.0}]
+        for distribution in distributions:
+            prefixes.append(log_convolve(prefixes[-1], distribution))
+        suffixes = [{0: 0.0}]
+        for distribution in reversed(distributions):
+            suffixes.append(log_convolve(suffixes[-1], distribution))
+        suffixes.reverse()
+
+        frontier_ways = prefixes[-1]
+        log_weight = log_sum([
+            ways + log_outside(k) for k, ways in frontier_ways.items()
+        ])
+        if log_weight == -math.inf:
+            log_weight = 0.0
+
+        for i, (cells, counts) in enumerate(solutions.values()):
+            others = log_convolve(prefixes[i], suffixes[i + 1])
+            hits = [0.0] * len(cells)
+            for k, (ways, counted) in counts.items():
+
+                # Probability that this component holds exactly k mines
+                chance = math.exp(math.log(ways) + log_sum([
+                    other + log_outside(k + j) for j, other in others.items()
+                ]) - log_weight)
+                for c, count in enumerate(counted):
+                    hits[c] += chance * (count / ways)
+            for cell, hit in zip(cells, hits):
+                probabilities[cell] = hit
+
+        density = None
+        if unconstrained:
+            if remaining is not None:
+                expected = sum(
+                    math.exp(ways + log_outside(k) - log_weight)
+                    * (remaining - k)
+                    for k, ways in frontier_ways.items()
+                )
+                density = expected / unconstrained
+            elif frontier:
+                density = sum(
+                    probabilities[cell] for cell in frontier
+                ) / len(frontier)
+            else:
+                density = 0.5
+
+        return probabilities, density
 
     def get_neighbors(self, cell):
         """
         Verify all the possible neighbor cells
         Return a set of those cells
         """
-        i, j = cell
-        neighbors = []
-        
-        # Cell not in a corner in i axis
-        if (i > 0 and i < self.height - 1):
-            neighbors.append((i-1, j))
-            neighbors.append((i+1, j))
-            # Cell not in a corner in j axis
-            if (j > 0 and j < self.width - 1):
-                neighbors.append((i+1, j-1)) 
-                neighbors.append((i-1, j-1))
-                neighbors.append((i, j-1))
-                neighbors.append((i+1, j+1)) 
-                neighbors.append((i-1, j+1))
-                neighbors.append((i, j+1))
-            # Cell in left corner in j axis
-            elif (j == 0):
-                neighbors.append((i+1, j+1)) 
-                neighbors.append((i-1, j+1))
-                neighbors.append((i, j+1))
-            # Cell in right corner in j axis 
-            elif (j == self.width - 1):
-                neighbors.append((i+1, j-1)) 
-                neighbors.append((i-1, j-1))
-                neighbors.append((i, j-1))
-        # Cell in top corner in i axis
-        elif (i == 0):
-            neighbors.append((i+1, j))
-            if (j > 0 and j < self.width - 1):
-                neighbors.append((i+1, j-1)) 
-                neighbors.append((i, j-1))
-                neighbors.append((i+1, j+1)) 
-                neighbors.append((i, j+1))
-            elif (j == 0):
-                neighbors.append((i+1, j+1)) 
-                neighbors.append((i, j+1))
-            elif (j == self.width - 1):
-                neighbors.append((i+1, j-1)) 
-                neighbors.append((i, j-1))
-        #   Cell in top corner or bottom  
-        elif (i == self.height - 1):
-            neighbors.append((i-1, j))
-            if (j > 0 and j < self.width - 1):
-                neighbors.append((i-1, j-1)) 
-                neighbors.append((i, j-1))
-                neighbors.append((i-1, j+1)) 
-                neighbors.append((i, j+1))
-            elif (j == 0):
-                neighbors.append((i-1, j+1)) 
-                neighbors.append((i, j+1))
-            elif (j == self.width - 1):
-                neighbors.append((i-1, j-1)) 
-                neighbors.append((i, j-1))
-                 
-        neighbors = set(neighbors)
-        return neighbors
+        index = self.to_index(cell)
+        return {self.to_cell(n) for n in self.topology.neighbors_of(index)}
 
     def check_neighbors(self, neighbors, count):
         """
@@ -333,12 +886,11 @@ class MinesweeperAI():
         If are mines rest 1 in count
         Returns new count and the checked list
         """
-        neighbors = list(neighbors)
         neighbors_aux = []
         for neighbor in neighbors:
-            if (neighbor in self.mines):
+            if self.mine_mask[neighbor]:
                 count = count - 1
-            if (neighbor not in self.safes) and (neighbor not in self.mines):
+            elif not self.safe_mask[neighbor]:
                 neighbors_aux.append(neighbor)
         return neighbors_aux, count
 
@@ -346,56 +898,59 @@ class MinesweeperAI():
         """
         Check all possible moves to do
         """
-        possible_moves = set()
-        for i in range(self.height):
-            for j in range(self.width):
-                cell_aux = (i, j)
-                if ((cell_aux not in self.mines) and (cell_aux not in self.moves_made)):
-                    possible_moves.add(cell_aux)
-        return possible_moves
+        return {
+            self.to_cell(index)
+            for index in self.possible[:self.possible_count]
+        }
         
     def check_mine_and_safe(self):
-        safes_aux = []
-        mines_aux = []
-
-        for sentence in self.knowledge:
-            for safe in sentence.known_safes():
-                if safe not in self.safes:
-                    safes_aux.append(safe)
-            for mine in sentence.known_mines():
-                if mine not in self.mines:
-                    mines_aux.append(mine)  
-         
-        # Get unique values
-        safes_aux = set(safes_aux)
-        mines_aux = set(mines_aux)
-        safes_aux = list(safes_aux)
-        mines_aux = list(mines_aux)
-        
-        # Mark
-        for save_aux in safes_aux:
-            self.mark_safe(save_aux)
-        for mine_aux in mines_aux:
-            self.mark_mine(mine_aux)  
+        """
+        Mark every cell queued as a known mine or safe. Marking a cell
+        only updates the sentences that contain it, which may queue
+        further cells; sentences left empty are dropped.
+        """
+        while self.marks:
+            cell, mine = self.marks.popleft()
+            if mine:
+                self.set_mine(cell)
+            else:
+                self.set_safe(cell)
 
     def check_sentences(self):
         """
-        Compare sentence w sentence except if
-        1. Are the same
-        2. Are empty
-        3. Doesn't have subset relation
-        Then compare subsets to find new sentences and append those to knowledge
+        Compare each new sentence only with the sentences that share
+        a cell with it, using the index. When one sentence's cells are
+        a subset of the other's, the difference of cells and counts is
+        a new sentence. Known mines and safes are marked first, and this
+        repeats until no new sentence can be inferred.
         """
-        new_sentences = []
+        while self.pending or self.marks:
+            if self.marks:
+                with self.timer("propagation"):
+                    self.check_mine_and_safe()
+                continue
+            sentence = self.pending.pop()
 
-        for sentence in self.knowledge:
-            for sentence_aux in self.knowledge:
-                if (not(sentence == sentence_aux) and ((len(sentence.cells) > 0) and (len(sentence_aux.cells) > 0)) and (sentence.cells.issubset(sentence_aux.cells))):
-                    modifiedSet = sentence_aux.cells - sentence.cells 
-                    modifiedCount = sentence_aux.count - sentence.count
-                    if (len(modifiedSet) > 0 and modifiedCount > -1):
-                        new_sentences.append(Sentence(modifiedSet, modifiedCount))
-
-        for sentence in new_sentences:
+            # Skip sentences since removed or changed
             if sentence not in self.knowledge:
-                self.knowledge.append(sentence) 
\ No newline at end of file
+                continue
+
+            with self.timer("inference"):
+                self.compare_sentence(sentence)
+
+    def compare_sentence(self, sentence):
+        """
+        Add the sentences inferred from `sentence` and each sentence
+        sharing a cell with it, when one is a subset of the other.
+        """
+        related = set()
+        for cell in sentence:
+            related.update(self.index.get(cell, ()))
+
+        for other in related:
+            if other == sentence:
+                continue
+            if sentence.issubset(other):
+                self.add_sentence(other.difference(sentence))
+            elif other.issubset(sentence):
+                self.add_sentence(sentence.difference(other))
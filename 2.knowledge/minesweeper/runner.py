@@ -1,5 +1,7 @@
 import pygame
+import queue
 import sys
+import threading
 import time
 
 from minesweeper import Minesweeper, MinesweeperAI
@@ -11,8 +13,70 @@ MINES = 8
 # Colors
 BLACK = (0, 0, 0)
 GRAY = (180, 180, 180)
+RED = (220, 60, 60)
 WHITE = (255, 255, 255)
 
+
+class AIWorker(threading.Thread):
+    """
+    Runs the AI in a background thread, so that inference never stalls
+    the game loop. The game loop puts requests on `requests`:
+        ("knowledge", cell, count) to add knowledge about a revealed cell
+        ("move",) to ask for the next AI move
+        ("stop",) to end the thread
+    and reads responses from `responses`:
+        ("probabilities", probabilities) with the latest mine probabilities
+        ("move", move, safe, mines) with the chosen move, whether it is
+        known to be safe, and the cells known to be mines
+    Whenever the knowledge changes and no request is waiting, the worker
+    speculatively computes mine probabilities while the user is idle.
+    """
+
+    def __init__(self, ai):
+        super().__init__(daemon=True)
+        self.ai = ai
+        self.requests = queue.Queue()
+        self.responses = queue.Queue()
+
+    def run(self):
+        stale = True
+        while True:
+
+            # Speculate while there is nothing else to do
+            if stale and self.requests.empty():
+                self.responses.put(
+                    ("probabilities", self.ai.mine_probabilities())
+                )
+                stale = False
+
+            request = self.requests.get()
+            if request[0] == "stop":
+                return
+            elif request[0] == "knowledge":
+                self.ai.add_knowledge(request[1], request[2])
+                stale = True
+            elif request[0] == "move":
+                move = self.ai.make_safe_move()
+                safe = move is not None
+                if not safe:
+                    move = self.ai.make_random_move()
+                self.responses.put(("move", move, safe, self.ai.mines))
+
+
+def start_worker():
+    """Start a worker thread with a new AI."""
+    worker = AIWorker(MinesweeperAI(height=HEIGHT, width=WIDTH, mines=MINES))
+    worker.start()
+    return worker
+
+
+def shade(probability):
+    """Blend from gray to red as the probability of a mine grows."""
+    return tuple(
+        round(g + (r - g) * probability) for g, r in zip(GRAY, RED)
+    )
+
+
 # Create game
 pygame.init()
 size = width, height = 600, 400
@@ -39,7 +103,13 @@ mine = pygame.transform.scale(mine, (cell_size, cell_size))
 
 # Create game and AI agent
 game = Minesweeper(height=HEIGHT, width=WIDTH, mines=MINES)
-ai = MinesweeperAI(height=HEIGHT, width=WIDTH)
+worker = start_worker()
+
+# Latest mine probabilities from the AI, if an AI move is awaited and
+# the flags when it was asked for
+heatmap = dict()
+waiting = False
+asked_flags = set()
 
 # Keep track of revealed cells, flagged cells, and if a mine was hit
 revealed = set()
@@ -110,7 +180,10 @@ while True:
                 board_origin[1] + i * cell_size,
                 cell_size, cell_size
             )
-            pygame.draw.rect(screen, GRAY, rect)
+            color = GRAY
+            if (i, j) not in revealed and (i, j) in heatmap:
+                color = shade(heatmap[(i, j)])
+            pygame.draw.rect(screen, color, rect)
             pygame.draw.rect(screen, WHITE, rect, 3)
 
             # Add a mine, flag, or number if needed
@@ -160,6 +233,7 @@ while True:
     screen.blit(text, textRect)
 
     move = None
+    retry = False
 
     left, _, right = pygame.mouse.get_pressed()
 
@@ -178,24 +252,21 @@ while True:
     elif left == 1:
         mouse = pygame.mouse.get_pos()
 
-        # If AI button clicked, make an AI move
+        # If AI button clicked, ask the AI for a move
         if aiButton.collidepoint(mouse) and not lost:
-            move = ai.make_safe_move()
-            if move is None:
-                move = ai.make_random_move()
-                if move is None:
-                    flags = ai.mines.copy()
-                    print("No moves left to make.")
-                else:
-                    print("No known safe moves, AI making random move.")
-            else:
-                print("AI making safe move.")
+            if not waiting:
+                worker.requests.put(("move",))
+                waiting = True
+                asked_flags = set(flags)
             time.sleep(0.2)
 
         # Reset game state
         elif resetButton.collidepoint(mouse):
             game = Minesweeper(height=HEIGHT, width=WIDTH, mines=MINES)
-            ai = MinesweeperAI(height=HEIGHT, width=WIDTH)
+            worker.requests.put(("stop",))
+            worker = start_worker()
+            heatmap = dict()
+            waiting = False
             revealed = set()
             flags = set()
             lost = False
@@ -210,13 +281,54 @@ while True:
                             and (i, j) not in revealed):
                         move = (i, j)
 
+    # Collect whatever the AI has finished without waiting for it
+    while True:
+        try:
+            response = worker.responses.get_nowait()
+        except queue.Empty:
+            break
+        if response[0] == "probabilities":
+            heatmap = response[1]
+        elif response[0] == "move" and waiting:
+            waiting = False
+            _, ai_move, safe, ai_mines = response
+            if lost:
+                continue
+            if ai_move is None:
+                flags = ai_mines
+                print("No moves left to make.")
+
+            # Ask again if the user played or flagged cells since asking
+            elif (move or ai_move in revealed
+                    or (ai_move in flags and flags != asked_flags)):
+                retry = True
+            elif ai_move in flags:
+                print("AI move is flagged, unflag it to let the AI play.")
+            elif safe:
+                print("AI making safe move.")
+                move = ai_move
+            else:
+                print("No known safe moves, AI making random move.")
+                move = ai_move
+
     # Make move and update AI knowledge
     if move:
+
+        # Place mines on the first move so that it opens safely
+        if not revealed:
+            game = Minesweeper(height=HEIGHT, width=WIDTH, mines=MINES,
+                               safe=move)
         if game.is_mine(move):
             lost = True
         else:
             nearby = game.nearby_mines(move)
             revealed.add(move)
-            ai.add_knowledge(move, nearby)
+            worker.requests.put(("knowledge", move, nearby))
+
+    # Ask for a new AI move after the AI has learned of this frame's move
+    if retry and not lost:
+        worker.requests.put(("move",))
+        waiting = True
+        asked_flags = set(flags)
 
     pygame.display.flip()
@@ -0,0 +1,136 @@
+import json
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import time
+
+from minesweeper import Minesweeper, MinesweeperAI
+
+SEED = 0
+
+
+def main():
+
+    # Check command-line arguments
+    if len(sys.argv) not in [5, 6, 7, 8]:
+        sys.exit("Usage: python simulate.py games height width density "
+                 "[processes] [seed] [metrics_directory]")
+    games = int(sys.argv[1])
+    height = int(sys.argv[2])
+    width = int(sys.argv[3])
+    mines = round(height * width * float(sys.argv[4]))
+    if not 0 <= mines < height * width:
+        sys.exit("Density must leave at least one safe cell")
+    processes = int(sys.argv[5]) if len(sys.argv) > 5 else None
+    seed = int(sys.argv[6]) if len(sys.argv) > 6 else SEED
+    metrics = sys.argv[7] if len(sys.argv) > 7 else None
+    if metrics is not None:
+        os.makedirs(metrics, exist_ok=True)
+
+    # Play games in parallel, each with its own seed
+    tasks = (
+        (height, width, mines, seed + game, metrics)
+        for game in range(games)
+    )
+    totals = {
+        "games": 0,
+        "wins": 0,
+        "moves": 0,
+        "inference_seconds": 0.0,
+        "max_rss_kb": 0
+    }
+    start = time.perf_counter()
+    with multiprocessing.Pool(processes) as pool:
+        chunksize = max(1, games // ((processes or os.cpu_count()) * 16))
+        for result in pool.imap_unordered(play_game, tasks, chunksize):
+            totals["games"] += 1
+            totals["wins"] += result["won"]
+            totals["moves"] += result["moves"]
+            totals["inference_seconds"] += result["inference_seconds"]
+            totals["max_rss_kb"] = max(
+                totals["max_rss_kb"], result["max_rss_kb"]
+            )
+    elapsed = time.perf_counter() - start
+
+    print(json.dumps({
+        "height": height,
+        "width": width,
+        "mines": mines,
+        "seed": seed,
+        "games": totals["games"],
+        "win_rate": totals["wins"] / max(totals["games"], 1),
+        "moves_per_game": totals["moves"] / max(totals["games"], 1),
+        "inference_seconds_per_move": (
+            totals["inference_seconds"] / max(totals["moves"], 1)
+        ),
+        "max_rss_kb": totals["max_rss_kb"],
+        "seconds": elapsed,
+        "games_per_second": totals["games"] / elapsed
+    }, indent=4))
+
+
+def play_game(task):
+    """
+    Play one headless game of the given size with the AI, seeding the
+    random number generator so the game can be replayed. Mines are
+    placed after the first move, away from it. If a metrics directory
+    is given, the AI's per-move profile is written there as JSON.
+
+    Return a dictionary with whether the game was won, how many moves
+    were made, the time spent choosing moves and adding knowledge, and
+    the peak memory of the worker process.
+    """
+    height, width, mines, seed, metrics = task
+    random.seed(seed)
+    game = None
+    ai = MinesweeperAI(height=height, width=width, mines=mines,
+                       profile=metrics is not None)
+
+    moves = 0
+    inference = 0.0
+    won = False
+    while True:
+        start = time.perf_counter()
+        move = ai.make_safe_move()
+        if move is None:
+            move = ai.make_random_move()
+        inference += time.perf_counter() - start
+
+        # No moves left means every safe cell has been revealed
+        if move is None:
+            won = True
+            break
+
+        # Place mines on the first move so that it opens safely
+        if game is None:
+            game = Minesweeper(height=height, width=width, mines=mines,
+                               safe=move)
+        if game.is_mine(move):
+            break
+
+        start = time.perf_counter()
+        ai.add_knowledge(move, game.nearby_mines(move))
+        inference += time.perf_counter() - start
+        moves += 1
+
+        if moves == height * width - mines:
+            won = True
+            break
+
+    if metrics is not None:
+        with open(os.path.join(metrics, f"game{seed}.json"), "w") as f:
+            ai.export_metrics(f)
+
+    return {
+        "seed": seed,
+        "won": won,
+        "moves": moves,
+        "inference_seconds": inference,
+        "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    }
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+import functools
+import itertools
+
+import numpy as np
+
+
+@functools.lru_cache(maxsize=None)
+def neighbor_table(shape, offsets, wrap):
+    """
+    Returns a read-only array with one row per cell of a board of the
+    given shape, holding the indices of the cells at each offset from it.
+    Missing neighbors are -1. With `wrap`, offsets wrap around the board
+    edges, and any neighbor repeated by a small board is kept once.
+    The table is built once per shape, offsets and wrap.
+    """
+    shape = np.array(shape)
+    coords = np.indices(shape).reshape(len(shape), -1).T
+    table = np.empty((len(coords), len(offsets)), dtype=np.int64)
+
+    for column, offset in enumerate(offsets):
+        neighbors = coords + np.array(offset)
+        if wrap:
+            neighbors %= shape
+            valid = np.ones(len(coords), dtype=bool)
+        else:
+            valid = np.all((neighbors >= 0) & (neighbors < shape), axis=1)
+            neighbors = np.where(valid[:, None], neighbors, 0)
+        index = np.ravel_multi_index(neighbors.T, shape)
+        table[:, column] = np.where(valid, index, -1)
+
+    # Wrapping a small board can reach a cell twice, or the cell itself
+    if wrap:
+        table.sort(axis=1)
+        table[:, 1:][table[:, 1:] == table[:, :-1]] = -1
+        table[table == np.arange(len(coords))[:, None]] = -1
+
+    table.setflags(write=False)
+    return table
+
+
+class Topology():
+    """
+    Shape of a board and the neighborhood of each of its cells.
+
+    Cells are tuples of coordinates and are also numbered with an
+    integer index in row-major order. The neighbors of every cell are
+    precomputed in `neighbors`, an array of indices padded with -1.
+    """
+
+    def __init__(self, shape, offsets, wrap=False):
+        self.shape = tuple(shape)
+        self.wrap = wrap
+        self.cells = int(np.prod(self.shape))
+        self.neighbors = neighbor_table(self.shape, tuple(offsets), wrap)
+
+        # Index stride of each coordinate
+        self.strides = tuple(
+            int(np.prod(self.shape[axis + 1:]))
+            for axis in range(len(self.shape))
+        )
+
+    def index(self, cell):
+        """Returns the integer index of a cell."""
+        return sum(c * stride for c, stride in zip(cell, self.strides))
+
+    def cell(self, index):
+        """Returns the cell of an integer index."""
+        index = int(index)
+        cell = []
+        for stride in self.strides:
+            c, index = divmod(index, stride)
+            cell.append(c)
+        return tuple(cell)
+
+    def neighbors_of(self, index):
+        """Returns the list of neighbor indices of the cell with an index."""
+        return [n for n in self.neighbors[index].tolist() if n >= 0]
+
+    def counts(self, board):
+        """
+        Returns an array of the board's shape with the number of true
+        neighbors of each cell of a boolean board.
+        """
+        flat = np.append(board.reshape(-1), False)
+        counts = flat[self.neighbors].sum(axis=1, dtype=np.int16)
+        return counts.reshape(self.shape)
+
+
+class MooreTopology(Topology):
+    """
+    Rectangular board of any number of dimensions in which every cell
+    touching another, including diagonally, is its neighbor: 8 in 2D
+    and 26 in 3D. With `wrap` the board is a torus.
+    """
+
+    def __init__(self, shape, wrap=False):
+        offsets = [
+            offset
+            for offset in itertools.product((-1, 0, 1), repeat=len(shape))
+            if any(offset)
+        ]
+        super().__init__(shape, offsets, wrap)
+
+
+class HexTopology(Topology):
+    """
+    Hexagonal board in axial coordinates, shaped as a parallelogram,
+    in which each cell has six neighbors. With `wrap` the board is a torus.
+    """
+
+    def __init__(self, height, width, wrap=False):
+        offsets = [(-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0)]
+        super().__init__((height, width), offsets, wrap)
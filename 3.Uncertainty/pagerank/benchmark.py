@@ -0,0 +1,246 @@
+import contextlib
+import io
+import json
+import os
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from pagerank import *
+
+SEED = 0
+POPULARITY = 1.0
+SMALL_CORPUS = 200
+SAMPLES_PER_PAGE = 100
+AGREEMENT = 1e-6
+WORKER_STAGES = ["crawl_graph", "cached_graph_cold", "parallel_pagerank"]
+
+
+def main():
+
+    # Check command-line arguments
+    if len(sys.argv) not in [5, 6, 7]:
+        sys.exit("Usage: python benchmark.py pages links dangling "
+                 "html|edges [output] [seed]")
+    pages = int(sys.argv[1])
+    links = float(sys.argv[2])
+    dangling = float(sys.argv[3])
+    layout = sys.argv[4]
+    if layout not in ["html", "edges"]:
+        sys.exit("Layout must be html or edges")
+    output = sys.argv[5] if len(sys.argv) > 5 else None
+    seed = int(sys.argv[6]) if len(sys.argv) > 6 else SEED
+
+    graph = generate_graph(pages, links, dangling, seed)
+    with tempfile.TemporaryDirectory() as directory:
+        results = run_benchmark(graph, layout, directory, seed)
+    results["graph"].update({
+        "links_per_page": links,
+        "dangling_fraction": dangling,
+        "layout": layout,
+        "seed": seed,
+        "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    })
+
+    report = json.dumps(results, indent=4)
+    if output is None:
+        print(report)
+    else:
+        with open(output, "w") as f:
+            f.write(report + "\n")
+
+
+def generate_graph(pages, links, dangling, seed=SEED):
+    """
+    Return a random LinkGraph with `pages` pages named page0.html,
+    page1.html, ... where a `dangling` fraction of pages have no links.
+
+    The other pages have a number of links drawn from a power law with
+    mean close to `links`. Link targets are drawn with probability
+    proportional to a power law of a random page ranking, so a few pages
+    collect most links, as on the web.
+    """
+    random_generator = np.random.default_rng(seed)
+    names = [f"page{i}.html" for i in range(pages)]
+
+    degree = (random_generator.pareto(2.0, pages) + 1) * links / 2
+    degree = np.clip(np.rint(degree), 1, pages - 1).astype(np.int64)
+    degree[random_generator.random(pages) < dangling] = 0
+
+    popularity = random_generator.permutation(pages) + 1.0
+    popularity = popularity ** -POPULARITY
+    sources = np.repeat(np.arange(pages), degree)
+    targets = random_generator.choice(
+        pages, size=len(sources), p=popularity / popularity.sum()
+    )
+
+    # Drop links from a page to itself and repeated links
+    keys = np.unique(sources[sources != targets] * pages
+                     + targets[sources != targets])
+    return LinkGraph(names, keys // pages, keys % pages)
+
+
+def write_html(graph, directory):
+    """Write every page of a LinkGraph as an HTML file in `directory`."""
+    indptr, indices = graph.links()
+    for i, page in enumerate(graph.pages):
+        with open(os.path.join(directory, page), "w") as f:
+            f.write(f"<!DOCTYPE html>\n<html>\n<head>\n"
+                    f"<title>{page}</title>\n</head>\n<body>\n")
+            for target in indices[indptr[i]:indptr[i + 1]].tolist():
+                f.write(f'<a href="{graph.pages[target]}">'
+                        f'{graph.pages[target]}</a>\n')
+            f.write("</body>\n</html>\n")
+
+
+def measure(function, *args, setup=None, **kwargs):
+    """
+    Run a function and return its result, the seconds it took and its
+    peak memory allocated in this process, in megabytes.
+
+    The function runs twice, calling `setup` first each time if given:
+    once timed, and once under tracemalloc to find the peak, since
+    tracing slows down Python code several times over.
+    """
+    runs = []
+    for traced in [False, True]:
+        if setup is not None:
+            setup()
+        if traced:
+            tracemalloc.start()
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = function(*args, **kwargs)
+        runs.append((result, time.perf_counter() - start))
+        if traced:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+    result, seconds = runs[0]
+    return result, seconds, peak / 2 ** 20
+
+
+def clear_cache(cache):
+    """Remove the files written by cached_graph at `cache`."""
+    for extension in [".json", ".pages", ".edges"]:
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(cache + extension)
+
+
+def run_benchmark(graph, layout, directory, seed=SEED):
+    """
+    Time crawling, sampling and every PageRank solver on `graph`, written
+    to `directory` as HTML files or as an edge list. Check each result
+    against a tight power iteration.
+
+    Return a dictionary describing the graph and every stage. Peak
+    memory counts this process only. Stages that start worker processes
+    also report the largest resident size of any worker so far.
+    """
+    total_pages = len(graph)
+    total_links = len(graph.sources)
+    small = total_pages <= SMALL_CORPUS
+    stages = []
+
+    def record(stage, seconds, peak, amount, unit, **extra):
+        if stage in WORKER_STAGES:
+            extra["children_max_rss_kb"] = resource.getrusage(
+                resource.RUSAGE_CHILDREN
+            ).ru_maxrss
+        stages.append({
+            "stage": stage,
+            "seconds": seconds,
+            "throughput": amount / seconds if seconds else None,
+            "unit": unit,
+            "peak_memory_mb": peak,
+            **extra
+        })
+
+    # Write the corpus and time reading it back
+    path = os.path.join(directory, "graph")
+    graph.save(path)
+    if layout == "html":
+        corpus = os.path.join(directory, "corpus")
+        os.mkdir(corpus)
+        write_html(graph, corpus)
+        cache = os.path.join(directory, "cache")
+        crawlers = [
+            ("crawl", crawl, [corpus], None),
+            ("crawl_graph", crawl_graph, [corpus], None),
+            ("cached_graph_cold", cached_graph, [corpus, cache],
+             lambda: clear_cache(cache)),
+            ("cached_graph_warm", cached_graph, [corpus, cache], None)
+        ]
+    else:
+        crawlers = [("load", LinkGraph.load, [path], None)]
+    for stage, function, args, setup in crawlers:
+        result, seconds, peak = measure(function, *args, setup=setup)
+        if isinstance(result, LinkGraph):
+            result = result.corpus
+        record(stage, seconds, peak, total_pages, "pages/s",
+               agrees=result == graph.corpus)
+
+    reference = matrix_pagerank(graph, DAMPING, tolerance=1e-14)[0]
+    reference = np.array([reference[page] for page in graph.pages])
+
+    def compare(stage, ranks, seconds, peak, amount, unit, limit, **extra):
+        if isinstance(ranks, dict):
+            ranks = np.array([ranks[page] for page in graph.pages])
+        distance = float(np.abs(ranks - reference).sum())
+        agrees = None if limit is None else bool(distance < limit)
+        record(stage, seconds, peak, amount, unit, l1_distance=distance,
+               agrees=agrees, **extra)
+
+    # Sampling agrees if it is within three standard errors per page
+    samples = max(SAMPLES, SAMPLES_PER_PAGE * total_pages)
+    samplers = [("vector_sample_pagerank", vector_sample_pagerank,
+                 [graph, DAMPING, samples], {"seed": seed})]
+    if small:
+        samplers.insert(0, ("sample_pagerank", sample_pagerank,
+                            [graph.corpus, DAMPING, SAMPLES], {}))
+    for stage, function, args, kwargs in samplers:
+        ranks, seconds, peak = measure(function, *args, **kwargs)
+        error = 3 * np.sqrt(reference * (1 - reference) / args[2]).sum()
+        compare(stage, ranks, seconds, peak, args[2], "samples/s", error,
+                samples=args[2])
+
+    # Solvers report links processed per second. iterate_pagerank stops
+    # once no page moves by more than 0.001, which gives no useful bound
+    # on its error, so only its distance is reported
+    if small:
+        ranks, seconds, peak = measure(iterate_pagerank, graph.corpus,
+                                       DAMPING)
+        compare("iterate_pagerank", ranks, seconds, peak, total_links,
+                "links/s", None)
+    solvers = [
+        ("matrix_pagerank", matrix_pagerank, [graph, DAMPING]),
+        ("parallel_pagerank", parallel_pagerank, [graph, DAMPING]),
+        ("out_of_core_pagerank", out_of_core_pagerank, [path, DAMPING])
+    ]
+    for stage, function, args in solvers:
+        (ranks, iterations), seconds, peak = measure(function, *args)
+        compare(stage, ranks, seconds, peak, total_links * iterations,
+                "links/s", AGREEMENT, iterations=iterations)
+    for method in METHODS:
+        (ranks, residuals), seconds, peak = measure(
+            solve_pagerank, graph, DAMPING, SolverConfig(method)
+        )
+        compare(f"solve_pagerank_{method}", ranks, seconds, peak,
+                total_links * len(residuals), "links/s", AGREEMENT,
+                iterations=len(residuals), residuals=residuals)
+
+    return {
+        "graph": {
+            "pages": total_pages,
+            "links": total_links,
+            "dangling_pages": int((graph.out_degree() == 0).sum())
+        },
+        "stages": stages
+    }
+
+
+if __name__ == "__main__":
+    main()
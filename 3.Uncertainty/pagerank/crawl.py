@@ -0,0 +1,24 @@
+import sys
+import time
+
+from pagerank import crawl_graph
+
+
+def main():
+
+    # Check command-line arguments
+    if len(sys.argv) not in [3, 4]:
+        sys.exit("Usage: python crawl.py corpus graph [processes]")
+    processes = int(sys.argv[3]) if len(sys.argv) == 4 else None
+
+    # Crawl the corpus and write its edge list
+    start = time.perf_counter()
+    graph = crawl_graph(sys.argv[1], processes)
+    graph.save(sys.argv[2])
+    seconds = time.perf_counter() - start
+    print(f"{len(graph)} pages, {len(graph.sources)} links "
+          f"in {seconds:.2f} seconds")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,24 +1,67 @@
+import functools
+import json
+import multiprocessing
 import os
+import posixpath
 import random
 import re
 import sys
+import threading
+import urllib.parse
+from array import array
+from html.parser import HTMLParser
+from multiprocessing import shared_memory
+
+import numpy as np
+import scipy.sparse
+import scipy.sparse.linalg
 
 DAMPING = 0.85
 SAMPLES = 10000
+TOLERANCE = 1e-10
+MAX_ITERATIONS = 1000
+SURFERS = 1000
+BURN_IN = 50
+SAMPLE_BUFFER = 1 << 20
+READ_SIZE = 1 << 16
+POOL_PAGES = 256
+SEED_BATCH = 64
+CHUNK_EDGES = 1 << 22
+METHODS = ["jacobi", "gauss-seidel", "aitken", "quadratic"]
+EXTRAPOLATE_EVERY = 10
+PUSH_RATIO = 0.1
+WORKER_POLL = 0.1
 
 
 def main():
-    if len(sys.argv) != 2:
-        sys.exit("Usage: python pagerank.py corpus")
-    corpus = crawl(sys.argv[1])
+    if len(sys.argv) not in [2, 3]:
+        sys.exit("Usage: python pagerank.py corpus [cache]")
+    if len(sys.argv) == 3:
+        graph = cached_graph(sys.argv[1], sys.argv[2])
+    else:
+        graph = crawl_graph(sys.argv[1])
+    corpus = graph.corpus
     ranks = sample_pagerank(corpus, DAMPING, SAMPLES)
     print(f"PageRank Results from Sampling (n = {SAMPLES})")
+    for page in sorted(ranks):
+        print(f"  {page}: {ranks[page]:.4f}")
+    ranks = vector_sample_pagerank(graph, DAMPING, SAMPLES)
+    print(f"PageRank Results from Vectorized Sampling (n = {SAMPLES})")
     for page in sorted(ranks):
         print(f"  {page}: {ranks[page]:.4f}")
     ranks = iterate_pagerank(corpus, DAMPING)
     print(f"PageRank Results from Iteration")
     for page in sorted(ranks):
         print(f"  {page}: {ranks[page]:.4f}")
+    ranks, iterations = matrix_pagerank(graph, DAMPING)
+    print(f"PageRank Results from Power Iteration ({iterations} iterations)")
+    for page in sorted(ranks):
+        print(f"  {page}: {ranks[page]:.4f}")
+    print(f"Solver Convergence")
+    for method in METHODS:
+        ranks, residuals = solve_pagerank(graph, DAMPING, SolverConfig(method))
+        print(f"  {method}: {len(residuals)} iterations, "
+              f"residual {residuals[-1]:.2e}")
 
 
 def crawl(directory):
@@ -48,6 +91,210 @@ def crawl(directory):
     return pages
 
 
+class LinkParser(HTMLParser):
+    """
+    HTML tokenizer that collects the href of every <a> tag it is fed.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.links = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag != "a":
+            return
+        for name, value in attrs:
+            if name == "href" and value:
+                self.links.append(value)
+
+
+def list_pages(directory):
+    """
+    Return the HTML pages in a directory tree, sorted, as paths relative
+    to `directory` with "/" separators.
+    """
+    pages = []
+    for root, folders, filenames in os.walk(directory):
+        folders.sort()
+        relative = os.path.relpath(root, directory)
+        for filename in filenames:
+            if not filename.endswith(".html"):
+                continue
+            page = os.path.normpath(os.path.join(relative, filename))
+            pages.append(page.replace(os.sep, "/"))
+    return sorted(pages)
+
+
+def resolve_link(page, link):
+    """
+    Return the page a link found on `page` points to, as a path relative
+    to the corpus root, or None if it points outside the corpus.
+    """
+    url = urllib.parse.urlsplit(link)
+    if url.scheme or url.netloc or not url.path:
+        return None
+    path = urllib.parse.unquote(url.path)
+    if path.startswith("/"):
+        path = path.lstrip("/")
+    else:
+        path = posixpath.join(posixpath.dirname(page), path)
+    path = posixpath.normpath(path)
+    if path == ".." or path.startswith("../"):
+        return None
+    return path
+
+
+def page_links(directory, page):
+    """
+    Return `page` and the set of pages it links to, parsing the file in
+    blocks of `READ_SIZE` characters rather than reading it whole.
+    """
+    parser = LinkParser()
+    path = os.path.join(directory, *page.split("/"))
+    with open(path, encoding="utf-8", errors="replace") as f:
+        for block in iter(functools.partial(f.read, READ_SIZE), ""):
+            parser.feed(block)
+    parser.close()
+
+    links = set()
+    for link in parser.links:
+        link = resolve_link(page, link)
+        if link is not None:
+            links.add(link)
+    links.discard(page)
+    return page, links
+
+
+def parse_pages(directory, pages, processes=None):
+    """
+    Yield each page and the set of pages it links to, in any order.
+    More than `POOL_PAGES` pages are parsed in a pool of processes.
+    """
+    parse = functools.partial(page_links, directory)
+    if len(pages) <= POOL_PAGES:
+        yield from map(parse, pages)
+        return
+    with multiprocessing.Pool(processes) as pool:
+        yield from pool.imap_unordered(parse, pages, chunksize=64)
+
+
+def crawl_graph(directory, processes=None):
+    """
+    Parse a directory tree of HTML pages in a pool of worker processes.
+    Return a LinkGraph with the links between pages in the corpus, where
+    pages are named by their path relative to `directory`.
+    """
+    pages = list_pages(directory)
+    index = {page: i for i, page in enumerate(pages)}
+    sources = array("l")
+    targets = array("l")
+
+    for page, links in parse_pages(directory, pages, processes):
+        source = index[page]
+        for link in links:
+            target = index.get(link)
+            if target is not None:
+                sources.append(source)
+                targets.append(target)
+
+    return LinkGraph(pages, sources, targets)
+
+
+def load_cache(cache):
+    """
+    Return the graph and manifest stored at `cache`, or None and an
+    empty manifest if there is no usable cache.
+    """
+    manifest = {"files": {}, "unresolved": {}}
+    try:
+        with open(cache + ".json", encoding="utf-8") as f:
+            stored = json.load(f)
+        graph = LinkGraph.load(cache)
+    except (OSError, ValueError):
+        return None, manifest
+    if (stored.get("pages") != len(graph)
+            or stored.get("links") != len(graph.sources)):
+        return None, manifest
+    return graph, stored
+
+
+def cached_graph(directory, cache, processes=None):
+    """
+    Return the LinkGraph of a directory tree of HTML pages, reusing the
+    graph stored at `cache` by a previous call.
+
+    Only pages whose modification time or size changed are parsed
+    again. The cache keeps, for every page, the links that pointed
+    outside the corpus, so they are restored if those pages appear.
+    """
+    pages = list_pages(directory)
+    files = {}
+    for page in pages:
+        stat = os.stat(os.path.join(directory, *page.split("/")))
+        files[page] = [stat.st_mtime_ns, stat.st_size]
+
+    cached, manifest = load_cache(cache)
+    unchanged = {
+        page for page in pages
+        if manifest["files"].get(page) == files[page]
+    }
+    if cached is not None and len(unchanged) == len(manifest["files"]) \
+            and len(unchanged) == len(pages):
+        return cached
+
+    index = {page: i for i, page in enumerate(pages)}
+    sources = array("l")
+    targets = array("l")
+    unresolved = {}
+
+    def add_links(page, links):
+        source = index[page]
+        for link in links:
+            target = index.get(link)
+            if target is None:
+                unresolved.setdefault(page, []).append(link)
+            else:
+                sources.append(source)
+                targets.append(target)
+
+    # Keep the links of unchanged pages, remapped to the new page indices
+    if cached is not None:
+        kept = np.array([page in unchanged for page in cached.pages])
+        remap = np.array([index.get(page, -1) for page in cached.pages])
+        keep = kept[cached.sources]
+        new_sources = remap[cached.sources[keep]]
+        new_targets = remap[cached.targets[keep]]
+        found = new_targets >= 0
+        sources.extend(new_sources[found].tolist())
+        targets.extend(new_targets[found].tolist())
+        for source, target in zip(cached.sources[keep][~found],
+                                  cached.targets[keep][~found]):
+            unresolved.setdefault(cached.pages[source], []).append(
+                cached.pages[target]
+            )
+        for page, links in manifest["unresolved"].items():
+            if page in unchanged:
+                add_links(page, links)
+
+    # Parse new and modified pages
+    changed = [page for page in pages if page not in unchanged]
+    for page, links in parse_pages(directory, changed, processes):
+        add_links(page, sorted(links))
+
+    graph = LinkGraph(pages, sources, targets)
+    graph.save(cache)
+    manifest = {
+        "pages": len(graph),
+        "links": len(graph.sources),
+        "files": files,
+        "unresolved": unresolved
+    }
+    with open(cache + ".json.tmp", "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(cache + ".json.tmp", cache + ".json")
+    return graph
+
+
 def transition_model(corpus, page, damping_factor):
     """
     Return a probability distribution over which page to visit next,
@@ -190,5 +437,755 @@ def iterate_pagerank(corpus, damping_factor):
     return normalized_distribution
 
 
+class LinkGraph():
+    """
+    Link graph of a corpus, stored as an edge list over page indices.
+
+    `pages` lists the page names, and `sources` and `targets` hold the
+    index of the linking and the linked page of every link. The sparse
+    transition matrix is built once, the first time it is needed.
+    """
+
+    def __init__(self, pages, sources, targets):
+        self.pages = list(pages)
+        self.sources = np.asarray(sources, dtype=np.int64)
+        self.targets = np.asarray(targets, dtype=np.int64)
+        self.matrix = None
+        self.dangling = None
+        self.link_arrays = None
+        self.corpus_dict = None
+
+    @classmethod
+    def from_corpus(cls, corpus):
+        """Return the link graph of a corpus dictionary."""
+        pages = sorted(corpus)
+        index = {page: i for i, page in enumerate(pages)}
+        sources = []
+        targets = []
+        for page in pages:
+            for link in corpus[page]:
+                sources.append(index[page])
+                targets.append(index[link])
+        return cls(pages, sources, targets)
+
+    def __len__(self):
+        return len(self.pages)
+
+    @property
+    def corpus(self):
+        """
+        Corpus dictionary from each page to the set of pages it links
+        to, built the first time it is needed.
+        """
+        if self.corpus_dict is None:
+            self.corpus_dict = {page: set() for page in self.pages}
+            for source, target in zip(self.sources.tolist(),
+                                      self.targets.tolist()):
+                self.corpus_dict[self.pages[source]].add(self.pages[target])
+        return self.corpus_dict
+
+    def out_degree(self):
+        """Return the number of links from each page."""
+        return np.bincount(self.sources, minlength=len(self))
+
+    def transition(self):
+        """
+        Return the link matrix in CSR format, whose entry (target, source)
+        is 1 / (number of links from source), and a boolean array marking
+        dangling pages, i.e. pages without links.
+        """
+        if self.matrix is None:
+            degree = self.out_degree()
+            weights = 1.0 / degree[self.sources]
+            self.matrix = scipy.sparse.csr_matrix(
+                (weights, (self.targets, self.sources)),
+                shape=(len(self), len(self))
+            )
+            self.dangling = degree == 0
+        return self.matrix, self.dangling
+
+    def links(self):
+        """
+        Return the links of every page in CSR form: the links from page i
+        are `indices[indptr[i]:indptr[i + 1]]`.
+        """
+        if self.link_arrays is None:
+            order = np.argsort(self.sources, kind="stable")
+            indptr = np.zeros(len(self) + 1, dtype=np.int64)
+            np.cumsum(self.out_degree(), out=indptr[1:])
+            self.link_arrays = (indptr, self.targets[order])
+        return self.link_arrays
+
+    def save(self, path):
+        """
+        Write the graph as `path`.pages, one page name per line, and
+        `path`.edges, the links as (source, target) pairs of 32-bit
+        integers sorted by target and then source.
+        """
+        with open(path + ".pages", "w", encoding="utf-8") as f:
+            for page in self.pages:
+                f.write(page + "\n")
+        order = np.lexsort((self.sources, self.targets))
+        edges = np.empty((len(order), 2), dtype="<i4")
+        edges[:, 0] = self.sources[order]
+        edges[:, 1] = self.targets[order]
+        edges.tofile(path + ".edges")
+
+    @classmethod
+    def load(cls, path):
+        """Read a graph written by `save`."""
+        with open(path + ".pages", encoding="utf-8") as f:
+            pages = f.read().splitlines()
+        edges = np.fromfile(path + ".edges", dtype="<i4").reshape(-1, 2)
+        return cls(pages, edges[:, 0], edges[:, 1])
+
+    def update(self, added=(), removed=()):
+        """
+        Return a new LinkGraph with the `added` links added and the
+        `removed` links removed, both given as (source, target) pairs of
+        page names. Pages not in the graph yet are added at the end.
+        """
+        pages = list(self.pages)
+        index = {page: i for i, page in enumerate(pages)}
+        for link in added:
+            for page in link:
+                if page not in index:
+                    index[page] = len(pages)
+                    pages.append(page)
+
+        def link_keys(sources, targets):
+            return np.asarray(sources, dtype=np.int64) * len(pages) + targets
+
+        def link_indices(links):
+            links = [(index[source], index[target]) for source, target in links
+                     if source in index and target in index and source != target]
+            return np.array(links, dtype=np.int64).reshape(-1, 2)
+
+        keys = link_keys(self.sources, self.targets)
+        removed = link_indices(removed)
+        keep = ~np.isin(keys, link_keys(removed[:, 0], removed[:, 1]))
+        added = np.unique(link_indices(added), axis=0)
+        new = ~np.isin(link_keys(added[:, 0], added[:, 1]), keys[keep])
+
+        sources = np.concatenate([self.sources[keep], added[new, 0]])
+        targets = np.concatenate([self.targets[keep], added[new, 1]])
+        return LinkGraph(pages, sources, targets)
+
+    def ranks(self, vector):
+        """Return a dictionary from page name to its value in `vector`."""
+        return dict(zip(self.pages, vector.tolist()))
+
+
+def vector_sample_pagerank(corpus, damping_factor, n, surfers=SURFERS,
+                           seed=None):
+    """
+    Return PageRank values for each page by sampling `n` pages with
+    many random surfers moving at once.
+
+    The links of every page are looked up in CSR arrays built once, so
+    each step costs O(1) per surfer instead of a full transition model.
+    Surfers start on random pages and walk `BURN_IN` steps before their
+    visits are counted, so the start does not bias the estimate.
+    """
+    graph = corpus
+    if not isinstance(graph, LinkGraph):
+        graph = LinkGraph.from_corpus(corpus)
+    indptr, indices = graph.links()
+    degree = np.diff(indptr)
+    total_pages = len(graph)
+    random_generator = np.random.default_rng(seed)
+
+    surfers = max(1, min(surfers, n))
+    steps = -(-n // surfers)
+    rows = max(1, SAMPLE_BUFFER // surfers)
+    visits = np.empty((rows, surfers), dtype=np.int64)
+    counts = np.zeros(total_pages, dtype=np.int64)
+    position = random_generator.integers(total_pages, size=surfers)
+
+    for step in range(BURN_IN + steps):
+        # Count the visits in batches to keep bincount cheap
+        if step >= BURN_IN:
+            row = (step - BURN_IN) % rows
+            visits[row] = position
+            if row == rows - 1 or step == BURN_IN + steps - 1:
+                counts += np.bincount(
+                    visits[:row + 1].ravel(), minlength=total_pages
+                )
+
+        # Follow a random link, or jump to a random page if the surfer
+        # gets bored or the page has no links
+        follow = random_generator.random(surfers) < damping_factor
+        follow &= degree[position] > 0
+        current = position[follow]
+        offset = random_generator.random(current.size) * degree[current]
+        position = random_generator.integers(total_pages, size=surfers)
+        position[follow] = indices[indptr[current] + offset.astype(np.int64)]
+
+    return graph.ranks(counts / counts.sum())
+
+
+def pagerank_step(matrix, dangling, damping_factor, rank, teleport):
+    """
+    Return the rank after one step of the random surfer from `rank`,
+    jumping according to `teleport` when bored or on a dangling page.
+    """
+    return damping_factor * (
+        matrix @ rank + teleport * (dangling @ rank)
+    ) + (1 - damping_factor) * teleport
+
+
+def power_iteration(matrix, dangling, damping_factor, tolerance=TOLERANCE,
+                    max_iterations=MAX_ITERATIONS, start=None, teleport=None):
+    """
+    Return the PageRank vector of a link matrix and the number of
+    iterations run, starting from `start` if given or else from the
+    teleport distribution.
+
+    Each iteration is one sparse matrix-vector product. A bored surfer,
+    or one on a dangling page, jumps to a page drawn from `teleport`,
+    which defaults to the uniform distribution. `teleport` may also be
+    an N x k matrix with one distribution per column, in which case the
+    k PageRank vectors are computed together as the columns of the
+    result. Iteration stops once the L1 distance between successive
+    vectors falls below `tolerance`, or after `max_iterations`.
+    """
+    total_pages = matrix.shape[0]
+    if teleport is None:
+        teleport = 1.0 / total_pages
+    else:
+        teleport = np.asarray(teleport, dtype=np.float64)
+        teleport = teleport / teleport.sum(axis=0)
+    if start is None:
+        rank = np.broadcast_to(teleport, np.shape(teleport) or total_pages)
+    else:
+        rank = np.asarray(start, dtype=np.float64)
+    rank = rank / rank.sum(axis=0)
+
+    for iteration in range(1, max_iterations + 1):
+        new_rank = pagerank_step(matrix, dangling, damping_factor, rank,
+                                 teleport)
+        residual = np.abs(new_rank - rank).sum(axis=0).max()
+        rank = new_rank
+        if residual < tolerance:
+            break
+
+    return rank, iteration
+
+
+def matrix_pagerank(corpus, damping_factor, tolerance=TOLERANCE,
+                    max_iterations=MAX_ITERATIONS):
+    """
+    Return PageRank values for each page, computed by power iteration on
+    a sparse transition matrix, and the number of iterations run.
+
+    `corpus` is either a corpus dictionary or a LinkGraph. The returned
+    dictionary has page names as keys and PageRank values summing to 1.
+    """
+    graph = corpus
+    if not isinstance(graph, LinkGraph):
+        graph = LinkGraph.from_corpus(corpus)
+    matrix, dangling = graph.transition()
+    rank, iterations = power_iteration(
+        matrix, dangling, damping_factor, tolerance, max_iterations
+    )
+    return graph.ranks(rank), iterations
+
+
+def push_pagerank(graph, start, damping_factor, tolerance=TOLERANCE):
+    """
+    Return the PageRank vector of a LinkGraph, refined from `start` by
+    Gauss-Southwell pushes, and the work done in passes over the links.
+
+    The residual of `start` is computed once. In each phase every page
+    whose residual exceeds `PUSH_RATIO` times the largest one moves it
+    into its rank and passes `damping_factor` of it on to the pages it
+    links to, then the pages that received rank are checked again. When
+    `start` is close, e.g. the ranks before a small edit, only the
+    pages near the edit push large amounts.
+
+    Residual spread evenly over all pages, as from dangling pages, only
+    scales the solution, so it is dropped and the result renormalized.
+    Phases stop once the L1 norm of the residual guarantees an error
+    below `tolerance`.
+    """
+    matrix, dangling = graph.transition()
+    indptr, indices = graph.links()
+    degree = np.diff(indptr)
+    total_pages = len(graph)
+    total_links = max(len(graph.sources), 1)
+
+    rank = np.asarray(start, dtype=np.float64) / np.sum(start)
+    residual = pagerank_step(matrix, dangling, damping_factor, rank,
+                             1.0 / total_pages) - rank
+    floor = tolerance * (1 - damping_factor) / total_pages
+    pushed = total_links
+
+    while True:
+        residual -= residual.mean()
+        size = np.abs(residual)
+        if size.sum() < tolerance * (1 - damping_factor):
+            break
+        threshold = max(PUSH_RATIO * size.max(), floor)
+        active = np.flatnonzero(size > threshold)
+
+        while active.size:
+            mass = residual[active]
+            rank[active] += mass
+            residual[active] = 0
+
+            # Pass rank on along every link of the active pages
+            linked = degree[active] > 0
+            sources = active[linked]
+            counts = degree[sources]
+            total = counts.sum()
+            offsets = np.arange(total) - np.repeat(
+                np.cumsum(counts) - counts, counts
+            )
+            targets = indices[np.repeat(indptr[sources], counts) + offsets]
+            weights = np.repeat(
+                damping_factor * mass[linked] / counts, counts
+            )
+            if 16 * total > total_pages:
+                residual += np.bincount(targets, weights,
+                                        minlength=total_pages)
+                touched = np.zeros(total_pages, dtype=bool)
+                touched[targets] = True
+                targets = np.flatnonzero(touched)
+            else:
+                np.add.at(residual, targets, weights)
+                targets = np.unique(targets)
+            pushed += total
+            active = targets[np.abs(residual[targets]) > threshold]
+
+    return rank / rank.sum(), pushed / total_links
+
+
+def update_pagerank(graph, ranks, damping_factor, added=(), removed=(),
+                    tolerance=TOLERANCE, max_iterations=MAX_ITERATIONS,
+                    push=True):
+    """
+    Return the LinkGraph after adding and removing links, its PageRank
+    values and the work done, in passes over the links.
+
+    `ranks` are the PageRank values of `graph` before the edit, and new
+    pages start with the average rank. By default the ranks are refined
+    with push_pagerank, which mostly works around the edited pages.
+    Otherwise power iteration starts from them, and each iteration is
+    one pass over the links.
+    """
+    graph = graph.update(added, removed)
+    total_pages = len(graph)
+    start = np.array([ranks.get(page, 1.0 / total_pages)
+                      for page in graph.pages])
+    if push:
+        rank, passes = push_pagerank(graph, start, damping_factor, tolerance)
+    else:
+        matrix, dangling = graph.transition()
+        rank, passes = power_iteration(
+            matrix, dangling, damping_factor, tolerance, max_iterations,
+            start
+        )
+    return graph, graph.ranks(rank), passes
+
+
+def personalized_pagerank(corpus, damping_factor, seeds, tolerance=TOLERANCE,
+                          max_iterations=MAX_ITERATIONS, batch=SEED_BATCH):
+    """
+    Return personalized PageRank values for each seed, and the largest
+    number of iterations run.
+
+    Each seed is either a dictionary from page name to weight, or a
+    collection of page names weighted equally, and describes where a
+    bored surfer jumps to. The transition matrix is built once, and the
+    seeds are solved `batch` at a time as the columns of one matrix.
+    Return a list with a dictionary of PageRank values per seed.
+    """
+    graph = corpus
+    if not isinstance(graph, LinkGraph):
+        graph = LinkGraph.from_corpus(corpus)
+    matrix, dangling = graph.transition()
+    index = {page: i for i, page in enumerate(graph.pages)}
+
+    results = []
+    iterations = 0
+    for first in range(0, len(seeds), batch):
+        group = seeds[first:first + batch]
+        teleport = np.zeros((len(graph), len(group)))
+        for column, seed in enumerate(group):
+            if not isinstance(seed, dict):
+                seed = dict.fromkeys(seed, 1)
+            for page, weight in seed.items():
+                teleport[index[page], column] += weight
+        if np.any(teleport.sum(axis=0) <= 0):
+            raise ValueError("seed without positive weight")
+        rank, steps = power_iteration(
+            matrix, dangling, damping_factor, tolerance, max_iterations,
+            teleport=teleport
+        )
+        results.extend(graph.ranks(column) for column in rank.T)
+        iterations = max(iterations, steps)
+
+    return results, iterations
+
+
+class SolverConfig():
+    """
+    Settings for solve_pagerank.
+
+    `method` is one of METHODS: "jacobi" is plain power iteration,
+    "gauss-seidel" uses each updated rank within the same sweep, and
+    "aitken" and "quadratic" are power iteration with Aitken or
+    quadratic extrapolation every `extrapolate_every` iterations.
+    """
+
+    def __init__(self, method="jacobi", tolerance=TOLERANCE,
+                 max_iterations=MAX_ITERATIONS,
+                 extrapolate_every=EXTRAPOLATE_EVERY):
+        if method not in METHODS:
+            raise ValueError(f"unknown method {method}")
+        self.method = method
+        self.tolerance = tolerance
+        self.max_iterations = max_iterations
+        self.extrapolate_every = extrapolate_every
+
+
+def aitken_extrapolation(ranks):
+    """
+    Return the Aitken delta-squared extrapolation of the last three
+    rank vectors, applied to each page separately.
+    """
+    previous, middle, last = ranks[-3:]
+    change = middle - previous
+    curvature = last - 2 * middle + previous
+    usable = np.abs(curvature) > 1e-15
+    rank = last.copy()
+    rank[usable] = previous[usable] - (
+        change[usable] ** 2 / curvature[usable]
+    )
+    return rank
+
+
+def quadratic_extrapolation(ranks):
+    """
+    Return the quadratic extrapolation of the last four rank vectors,
+    assuming their error lies mostly in the first two eigenvectors.
+    """
+    first, second, third, fourth = ranks[-4:]
+    differences = np.column_stack([second - first, third - first])
+    gamma = np.linalg.lstsq(differences, first - fourth, rcond=None)[0]
+    gamma = np.append(gamma, 1.0)
+    return ((gamma.sum() * second + gamma[1:].sum() * third)
+            + gamma[2] * fourth)
+
+
+def solve_pagerank(corpus, damping_factor, config=None):
+    """
+    Return PageRank values for each page, computed by the solver that
+    `config` describes, and the residual of every iteration.
+
+    The residual is the L1 distance between successive rank vectors.
+    Iteration stops once it falls below the configured tolerance, or
+    after the configured maximum number of iterations.
+    """
+    if config is None:
+        config = SolverConfig()
+    graph = corpus
+    if not isinstance(graph, LinkGraph):
+        graph = LinkGraph.from_corpus(corpus)
+    matrix, dangling = graph.transition()
+    total_pages = len(graph)
+    teleport = 1.0 / total_pages
+    rank = np.full(total_pages, teleport)
+
+    # Gauss-Seidel solves (I - damping * matrix) x = b by sweeping with
+    # the lower triangle, with the dangling rank taken from the last sweep
+    if config.method == "gauss-seidel":
+        system = scipy.sparse.identity(total_pages, format="csr")
+        system = system - damping_factor * matrix
+        lower = scipy.sparse.tril(system, format="csr")
+        upper = scipy.sparse.triu(system, k=1, format="csr")
+
+    history = [rank]
+    residuals = []
+    for iteration in range(1, config.max_iterations + 1):
+        if config.method == "gauss-seidel":
+            constant = damping_factor * teleport * (dangling @ rank)
+            constant += (1 - damping_factor) * teleport
+            new_rank = scipy.sparse.linalg.spsolve_triangular(
+                lower, constant - upper @ rank, lower=True
+            )
+            new_rank /= new_rank.sum()
+        else:
+            new_rank = pagerank_step(matrix, dangling, damping_factor, rank,
+                                     teleport)
+
+        residuals.append(float(np.abs(new_rank - rank).sum()))
+        rank = new_rank
+        if residuals[-1] < config.tolerance:
+            break
+
+        # Replace the rank with an extrapolation of the latest ranks
+        history = history[-3:] + [rank]
+        if config.method == "aitken" and len(history) >= 3 \
+                and iteration % config.extrapolate_every == 0:
+            rank = aitken_extrapolation(history)
+        elif config.method == "quadratic" and len(history) == 4 \
+                and iteration % config.extrapolate_every == 0:
+            rank = quadratic_extrapolation(history)
+        if rank is not history[-1]:
+            rank = np.clip(rank, 0, None)
+            rank /= rank.sum()
+            history = [rank]
+
+    return graph.ranks(rank), residuals
+
+
+def count_pages(path):
+    """Return the number of pages in the page table of a saved graph."""
+    lines = 0
+    with open(path + ".pages", "rb") as f:
+        for block in iter(functools.partial(f.read, READ_SIZE), b""):
+            lines += block.count(b"\n")
+    return lines
+
+
+def edge_chunks(edges, chunk):
+    """Yield the sources and targets of consecutive blocks of edges."""
+    for start in range(0, len(edges), chunk):
+        block = np.asarray(edges[start:start + chunk])
+        yield block[:, 0], block[:, 1]
+
+
+def degree_file(path, edges, total_pages, chunk):
+    """
+    Return the out-degree of every page of a saved graph, memory-mapped
+    from `path`.degrees, computing it first if missing or stale.
+    """
+    degrees = path + ".degrees"
+    try:
+        fresh = (os.path.getmtime(degrees) >= os.path.getmtime(path + ".edges")
+                 and os.path.getsize(degrees) == 4 * total_pages)
+    except OSError:
+        fresh = False
+    if not fresh:
+        degree = np.memmap(degrees, dtype="<i4", mode="w+",
+                           shape=(total_pages,))
+        for sources, _ in edge_chunks(edges, chunk):
+            counts = np.bincount(sources)
+            degree[:len(counts)] += counts
+        degree.flush()
+        del degree
+    return np.memmap(degrees, dtype="<i4", mode="r", shape=(total_pages,))
+
+
+def out_of_core_pagerank(path, damping_factor, tolerance=TOLERANCE,
+                         max_iterations=MAX_ITERATIONS, chunk=CHUNK_EDGES):
+    """
+    Return the PageRank vector of a graph written by LinkGraph.save, in
+    page table order, and the number of iterations run.
+
+    The edge list and the out-degrees are memory-mapped and read
+    `chunk` edges or pages at a time, so only the current and the next
+    rank vectors are held in memory. Since edges are sorted by target,
+    each chunk adds into a narrow slice of the next rank vector.
+    """
+    total_pages = count_pages(path)
+    if os.path.getsize(path + ".edges"):
+        edges = np.memmap(path + ".edges", dtype="<i4", mode="r")
+        edges = edges.reshape(-1, 2)
+    else:
+        edges = np.empty((0, 2), dtype="<i4")
+    degree = degree_file(path, edges, total_pages, chunk)
+
+    rank = np.full(total_pages, 1.0 / total_pages)
+    new_rank = np.empty(total_pages)
+    for iteration in range(1, max_iterations + 1):
+
+        # Spread the rank of every page over its links
+        new_rank[:] = 0
+        for sources, targets in edge_chunks(edges, chunk):
+            low = targets.min()
+            high = targets.max() + 1
+            new_rank[low:high] += np.bincount(
+                targets - low,
+                weights=rank[sources] / degree[sources],
+                minlength=high - low
+            )
+
+        # Spread the rank of dangling pages over all pages
+        dangling = 0.0
+        for start in range(0, total_pages, chunk):
+            block = slice(start, start + chunk)
+            dangling += rank[block][degree[block] == 0].sum()
+        new_rank += dangling / total_pages
+        new_rank *= damping_factor
+        new_rank += (1 - damping_factor) / total_pages
+
+        residual = 0.0
+        for start in range(0, total_pages, chunk):
+            block = slice(start, start + chunk)
+            residual += np.abs(new_rank[block] - rank[block]).sum()
+        rank, new_rank = new_rank, rank
+        if residual < tolerance:
+            break
+
+    return rank, iteration
+
+
+def attach_arrays(names, total_pages, processes):
+    """
+    Return the shared memory blocks with the given names and the arrays
+    they hold: the two rank vectors, the per-worker partial sums and
+    the control values (stop flag and dangling rank).
+    """
+    memories = [shared_memory.SharedMemory(name=name) for name in names]
+    vectors = np.ndarray((2, total_pages), buffer=memories[0].buf)
+    partials = np.ndarray((processes, 2), buffer=memories[1].buf)
+    control = np.ndarray(2, buffer=memories[2].buf)
+    return memories, vectors, partials, control
+
+
+def rank_worker(worker, rows, block, dangling, names, processes,
+                damping_factor, barrier):
+    """
+    Compute the rows `rows` of every new rank vector in a worker process.
+
+    Each round starts and ends at `barrier`. In between, the worker
+    multiplies its rows of the link matrix by the current rank vector
+    and stores its share of the dangling rank and of the residual.
+    """
+    total_pages = block.shape[1]
+    memories = []
+    vectors = partials = control = None
+    try:
+        memories, vectors, partials, control = attach_arrays(
+            names, total_pages, processes
+        )
+        iteration = 0
+        while True:
+            barrier.wait()
+            if control[0]:
+                break
+            rank = vectors[iteration % 2]
+            new_rank = damping_factor * (
+                block @ rank + control[1] / total_pages
+            ) + (1 - damping_factor) / total_pages
+            vectors[(iteration + 1) % 2, rows] = new_rank
+            partials[worker] = [
+                new_rank[dangling].sum(),
+                np.abs(new_rank - rank[rows]).sum()
+            ]
+            iteration += 1
+            barrier.wait()
+    except threading.BrokenBarrierError:
+        pass
+    except Exception:
+        barrier.abort()
+        raise
+    finally:
+        del vectors, partials, control
+        for memory in memories:
+            memory.close()
+
+
+def watch_workers(workers, barrier, stop):
+    """
+    Abort `barrier` if any worker process exits with an error before
+    `stop` is set, so nobody waits forever for a worker that has died.
+    """
+    while not stop.wait(WORKER_POLL):
+        if any(process.exitcode for process in workers):
+            barrier.abort()
+            return
+
+
+def parallel_pagerank(corpus, damping_factor, processes=None,
+                      tolerance=TOLERANCE, max_iterations=MAX_ITERATIONS):
+    """
+    Return PageRank values for each page, computed by power iteration
+    split over worker processes, and the number of iterations run.
+
+    The link matrix is split into blocks of rows with about the same
+    number of links, one per worker. The rank vectors live in shared
+    memory, and every iteration is one round between two barriers.
+    """
+    graph = corpus
+    if not isinstance(graph, LinkGraph):
+        graph = LinkGraph.from_corpus(corpus)
+    matrix, dangling = graph.transition()
+    total_pages = len(graph)
+    processes = processes or os.cpu_count()
+
+    # Split rows so each worker gets a similar share of the links
+    bounds = np.searchsorted(
+        matrix.indptr, np.linspace(0, matrix.nnz, processes + 1)
+    )
+    bounds[0] = 0
+    bounds[-1] = total_pages
+
+    sizes = [16 * total_pages, 16 * processes, 16]
+    memories = [shared_memory.SharedMemory(create=True, size=size)
+                for size in sizes]
+    names = [memory.name for memory in memories]
+    _, vectors, partials, control = attach_arrays(
+        names, total_pages, processes
+    )
+    vectors[0] = 1.0 / total_pages
+    control[:] = [0, dangling.sum() / total_pages]
+
+    barrier = multiprocessing.Barrier(processes + 1)
+    workers = []
+    for worker in range(processes):
+        rows = slice(bounds[worker], bounds[worker + 1])
+        workers.append(multiprocessing.Process(
+            target=rank_worker,
+            args=(worker, rows, matrix[rows], dangling[rows], names,
+                  processes, damping_factor, barrier)
+        ))
+
+    # A worker killed by a signal never reaches the barrier, so a watcher
+    # thread aborts it and the waits below raise instead of hanging
+    stop = threading.Event()
+    watcher = threading.Thread(target=watch_workers,
+                               args=(workers, barrier, stop), daemon=True)
+    watcher.start()
+    try:
+        for process in workers:
+            process.start()
+        for iteration in range(1, max_iterations + 1):
+            barrier.wait()
+            barrier.wait()
+            control[1] = partials[:, 0].sum()
+            if partials[:, 1].sum() < tolerance:
+                break
+        rank = vectors[iteration % 2].copy()
+        control[0] = 1
+        barrier.wait()
+    except threading.BrokenBarrierError:
+        stop.set()
+        watcher.join()
+        for process in workers:
+            process.join()
+        codes = [process.exitcode for process in workers]
+        raise RuntimeError(
+            f"Worker processes exited with codes {codes}"
+        ) from None
+    except BaseException:
+        barrier.abort()
+        raise
+    finally:
+        stop.set()
+        watcher.join()
+        for process in workers:
+            if process.pid is not None:
+                process.join()
+        del vectors, partials, control
+        for memory in memories:
+            memory.close()
+            memory.unlink()
+
+    return graph.ranks(rank), iteration
+
+
 if __name__ == "__main__":
     main()